@@ -2,26 +2,119 @@ from brownie import interface, chain, web3
 from web3._utils.events import construct_event_topic_set
 import os, json, datetime, time, utils, subprocess
 import duckdb
+from utils import ens, rpc
 import pandas as pd
 
 MAX_RANGE = 50_000
 DEPLOY_BLOCK = 18_029_884
 CONTRACT_ADDRESS = '0x06bDF212C290473dCACea9793890C5024c7Eb02c'
 FILE_PATH = 'raw_boost_data.json'
-    
+
+# Append-only NDJSON segments: 'raw' holds indexed events, 'enriched' the same
+# events with ENS names and timestamps. The sidecar cursor records, per stream,
+# the last block covered and the committed length of the open segment; the
+# enriched entry also keeps the raw position consumed so far.
+STORE_DIR = 'boost_logs'
+CURSOR_PATH = os.path.join(STORE_DIR, 'cursor.json')
+SEGMENT_BYTES = 16 * 1024 * 1024
+STREAMS = ['raw', 'enriched']
+ENRICH_CHUNK = 5_000
+
+def load_cursor():
+    if os.path.exists(CURSOR_PATH):
+        with open(CURSOR_PATH) as file:
+            return json.load(file)
+    cursor = {stream: {'block': DEPLOY_BLOCK, 'segment': 0, 'offset': 0} for stream in STREAMS}
+    cursor['enriched']['source'] = {'segment': 0, 'offset': 0}
+    migrate_legacy_file(cursor)
+    return cursor
+
+def save_cursor(cursor):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    tmp_path = f'{CURSOR_PATH}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(cursor, file, indent=2)
+    os.replace(tmp_path, CURSOR_PATH)
+
+def segment_path(stream, segment):
+    return os.path.join(STORE_DIR, stream, f'{segment:05d}.ndjson')
+
+def append_records(cursor, stream, records, block):
+    """Append records to a stream and advance its cursor to block."""
+    state = cursor[stream]
+    path = segment_path(stream, state['segment'])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if state['offset'] >= SEGMENT_BYTES:
+        state['segment'], state['offset'] = state['segment'] + 1, 0
+        path = segment_path(stream, state['segment'])
+    with open(path, 'ab') as file:
+        # Drop anything written after the last committed cursor (interrupted run)
+        file.truncate(state['offset'])
+        file.write(''.join(json.dumps(r) + '\n' for r in records).encode())
+        state['offset'] = file.tell()
+    state['block'] = block
+
+def iter_records(cursor, stream, start=None):
+    """
+    Yield (record, position) for committed records of a stream, starting at a
+    {'segment', 'offset'} position. Each position is where reading resumes
+    after its record, so consumers can persist it and seek back to it.
+    """
+    state = cursor[stream]
+    start = start or {'segment': 0, 'offset': 0}
+    for segment in range(start['segment'], state['segment'] + 1):
+        path = segment_path(stream, segment)
+        if not os.path.exists(path):
+            continue
+        limit = state['offset'] if segment == state['segment'] else None
+        with open(path, 'rb') as file:
+            offset = start['offset'] if segment == start['segment'] else 0
+            file.seek(offset)
+            for line in file:
+                offset += len(line)
+                if limit is not None and offset > limit:
+                    return
+                yield json.loads(line), {'segment': segment, 'offset': offset}
+
+def read_records(cursor, stream, after_block=None):
+    """Yield committed records of a stream, optionally only those past after_block."""
+    for record, _ in iter_records(cursor, stream):
+        if after_block is None or record['block'] > after_block:
+            yield record
+
+def end_position(cursor, stream):
+    """Position just past the last committed record of a stream."""
+    return {'segment': cursor[stream]['segment'], 'offset': cursor[stream]['offset']}
+
+def migrate_legacy_file(cursor):
+    """Seed both streams from an existing raw_boost_data.json, once."""
+    if not os.path.exists(FILE_PATH):
+        return
+    with open(FILE_PATH) as file:
+        data = json.load(file)
+    data = data['data'] if isinstance(data, dict) else data
+    if not data:
+        return
+    enriched = [d for d in data if 'timestamp' in d]
+    raw_keys = ['account', 'receiver', 'boost_delegate', 'amount', 'adjusted_amount', 'fee', 'txn_hash', 'block']
+    raw = [{k: d[k] for k in raw_keys} for d in data]
+    append_records(cursor, 'raw', raw, data[-1]['block'])
+    if enriched:
+        # Records are enriched oldest first, so the enriched ones form a prefix
+        append_records(cursor, 'enriched', enriched, enriched[-1]['block'])
+        # One append writes a single segment; point the enricher just past the prefix
+        offset = sum(len((json.dumps(r) + '\n').encode()) for r in raw[:len(enriched)])
+        cursor['enriched']['source'] = {'segment': 0, 'offset': offset}
+    save_cursor(cursor)
+    print(f'Migrated {len(data)} records from {FILE_PATH} into {STORE_DIR}/')
+
 def get_logs():
     vault = interface.PrismaVault(CONTRACT_ADDRESS)
     contract = web3.eth.contract(address=vault.address, abi=vault.abi)
     topics = construct_event_topic_set(contract.events.BoostConsumed().abi, web3.codec)
 
-    last_item = None
-    if os.path.exists(FILE_PATH):
-        with open(FILE_PATH) as file:
-            data = json.load(file)
-            data = data['data'] if isinstance(data, dict) else data
-            last_item = data[-1] if data else None
-
-    to_block = last_item['block'] if last_item else DEPLOY_BLOCK
+    cursor = load_cursor()
+    to_block = cursor['raw']['block']
     overall_start_time = time.time()
 
     while to_block < chain.height:
@@ -40,89 +133,168 @@ def get_logs():
             'block': e.blockNumber
         } for e in events]
 
-        mode = 'w' if not os.path.exists(FILE_PATH) else 'r+'
-        with open(FILE_PATH, mode) as file:
-            existing_data = json.load(file) if mode == 'r+' else {}
-            existing_data = existing_data['data'] if isinstance(existing_data, dict) else existing_data
-            file.seek(0)
-            data = {
-                'last_updated': chain.time(),
-                'data': existing_data + formatted_events
-            }
-            json.dump(data, file, indent=2)
-            file.truncate()
+        append_records(cursor, 'raw', formatted_events, to_block)
+        save_cursor(cursor)
 
         print(f'Found {len(events)} events. Loop took {time.time() - overall_start_time} seconds.')
 
     print(f'Total execution time: {time.time() - overall_start_time} seconds.')
 
 def process_logs():
-    if not os.path.exists(FILE_PATH):
-        return
+    """Enrich pending raw records, then bring the DuckDB mirror up to date."""
+    cursor = load_cursor()
+    if cursor['enriched']['block'] < cursor['raw']['block']:
+        enrich_pending(cursor)
+    # Runs even with nothing to enrich, so a missing or stale mirror catches up
+    sync_boost_db(cursor)
 
-    with open(FILE_PATH) as file:
-        data = json.load(file)
+def enrich_pending(cursor):
+    """
+    Enrich raw records past the enriched cursor, ENRICH_CHUNK records at a time:
+    one bulk ENS resolution and one batched header fetch per chunk, with the
+    system week computed from the week calendar. The enriched cursor keeps the
+    raw position it has consumed up to ('source'), so each run seeks straight
+    to the unprocessed tail.
+    """
+    raw_block = cursor['raw']['block']
+    week_origin = utils.utils.get_week_start_ts(CONTRACT_ADDRESS, 0)
+    pending = iter_records(cursor, 'raw', start=cursor['enriched']['source'])
+    chunk, position = [], None
+    for record, next_position in pending:
+        # Only cut between blocks so the cursor never splits a block
+        if len(chunk) >= ENRICH_CHUNK and record['block'] != chunk[-1]['block']:
+            enrich_chunk(cursor, chunk, chunk[-1]['block'], week_origin, position)
+            chunk = []
+        chunk.append(record)
+        position = next_position
+    enrich_chunk(cursor, chunk, raw_block, week_origin, end_position(cursor, 'raw'))
 
-    data = data['data'] if isinstance(data, dict) else data
+def enrich_chunk(cursor, records, block, week_origin, source):
+    names = ens.resolve({d[k] for d in records for k in ['account', 'receiver', 'boost_delegate']})
+    timestamps = rpc.get_block_timestamps(d['block'] for d in records)
+    for d in records:
+        ts = timestamps[d['block']]
+        d.update({
+            'account_ens': names[d['account']],
+            'receiver_ens': names[d['receiver']],
+            'boost_delegate_ens': names[d['boost_delegate']],
+            'timestamp': ts,
+            'date_str': datetime.datetime.utcfromtimestamp(ts).strftime("%m/%d/%Y, %H:%M:%S"),
+            'system_week': (ts - week_origin) // utils.utils.WEEK,
+        })
+    append_records(cursor, 'enriched', records, block)
+    cursor['enriched']['source'] = source
+    save_cursor(cursor)
+    print(f'Enriched {len(records)} records through block {block:_}')
 
-    for d in data:
-        if 'timestamp' not in d:
-            d['account_ens'] = utils.utils.get_ens_from_cache(d['account'])
-            d['receiver_ens'] = utils.utils.get_ens_from_cache(d['receiver'])
-            d['boost_delegate_ens'] = utils.utils.get_ens_from_cache(d['boost_delegate'])
-            block_info = chain[d['block']]
-            ts = block_info.timestamp
-            d.update({
-                'timestamp': ts,
-                'date_str': datetime.datetime.utcfromtimestamp(ts).strftime("%m/%d/%Y, %H:%M:%S"),
-                'system_week': utils.utils.get_week_by_ts(ts)
-            })
-
-    with open(FILE_PATH, 'w') as file:
-        data = {
-            'last_updated': chain.time(),
-            'data': data
-        }
-        json.dump(data, file, indent=4)
+def publish():
+    """Materialize raw_boost_data.json from the enriched stream."""
+    cursor = load_cursor()
+    tmp_path = f'{FILE_PATH}.tmp'
+    with open(tmp_path, 'w') as file:
+        file.write(f'{{\n    "last_updated": {chain.time()},\n    "data": [')
+        for i, record in enumerate(read_records(cursor, 'enriched')):
+            body = json.dumps(record, indent=4).replace('\n', '\n        ')
+            file.write(f'{"," if i else ""}\n        {body}')
+        file.write('\n    ]\n}')
+    os.replace(tmp_path, FILE_PATH)
+
+BOOST_DB_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS boost_data (
+        account VARCHAR, receiver VARCHAR, boost_delegate VARCHAR,
+        amount DOUBLE, adjusted_amount DOUBLE, fee DOUBLE,
+        txn_hash VARCHAR, block BIGINT,
+        account_ens VARCHAR, receiver_ens VARCHAR, boost_delegate_ens VARCHAR,
+        timestamp BIGINT, date_str VARCHAR, system_week BIGINT
+    )
+"""
 
-def run_queries():
+# Enriched stream position the mirror holds everything up to
+BOOST_SYNC_SCHEMA = "CREATE TABLE IF NOT EXISTS boost_sync (segment BIGINT, byte_offset BIGINT)"
+
+def sync_boost_db(cursor):
+    """Append enriched records past the mirror's stored position to the local DuckDB file."""
+    conn = duckdb.connect(utils.utils.BOOST_DB_PATH)
+    try:
+        conn.execute(BOOST_DB_SCHEMA)
+        conn.execute(BOOST_SYNC_SCHEMA)
+        synced = conn.execute('SELECT segment, byte_offset FROM boost_sync').fetchone()
+        if synced:
+            pending = iter_records(cursor, 'enriched', start={'segment': synced[0], 'offset': synced[1]})
+        else:
+            # New mirror, or one written before the position was stored.
+            # Logs are indexed whole block ranges at a time, so a block is never partially mirrored
+            last_block = conn.execute('SELECT MAX(block) FROM boost_data').fetchone()[0] or 0
+            pending = ((r, p) for r, p in iter_records(cursor, 'enriched') if r['block'] > last_block)
+        new_records = [record for record, _ in pending]
+        position = end_position(cursor, 'enriched')
+
+        conn.execute('BEGIN TRANSACTION')
+        if new_records:
+            columns = [c[0] for c in conn.execute('DESCRIBE boost_data').fetchall()]
+            conn.register('new_rows', pd.DataFrame(new_records, columns=columns))
+            conn.execute(f"INSERT INTO boost_data SELECT {', '.join(columns)} FROM new_rows")
+            conn.unregister('new_rows')
+        conn.execute('DELETE FROM boost_sync')
+        conn.execute('INSERT INTO boost_sync VALUES (?, ?)', [position['segment'], position['offset']])
+        conn.execute('COMMIT')
+        if new_records:
+            print(f'Mirrored {len(new_records)} boost records to {utils.utils.BOOST_DB_PATH}')
+    finally:
+        conn.close()
+
+# Leaderboards: (output file, record field, ens field, summed field, output column)
+LEADERBOARDS = [
+    ("top_accounts_by_fees_paid.json", 'account', 'account_ens', 'fee', 'total_fees_paid'),
+    ("top_boost_delegates_by_fees_earned.json", 'boost_delegate', 'boost_delegate_ens', 'fee', 'earned_fees'),
+    ("top_accounts_by_total_emissions_claimed.json", 'account', 'account_ens', 'adjusted_amount', 'amount'),
+    ("top_receivers_by_emissions_claimed.json", 'receiver', 'receiver_ens', 'adjusted_amount', 'amount'),
+]
+AGGREGATES_PATH = os.path.join(STORE_DIR, 'aggregates.json')
+
+def update_aggregates(cursor, rebuild=False):
+    """
+    Running sums per leaderboard, keyed by address and ENS name. Only enriched
+    records past the stored stream position are folded in unless rebuild is set.
+    """
+    aggregates = None
+    if not rebuild and os.path.exists(AGGREGATES_PATH):
+        with open(AGGREGATES_PATH) as file:
+            aggregates = json.load(file)
+    if aggregates is None:
+        aggregates = {'position': None, 'sums': {name: {} for name, *_ in LEADERBOARDS}}
+
+    for record, _ in iter_records(cursor, 'enriched', start=aggregates['position']):
+        for name, field, ens_field, value_field, _ in LEADERBOARDS:
+            by_ens = aggregates['sums'][name].setdefault(record[field], {})
+            ens_name = record[ens_field] or ''
+            by_ens[ens_name] = by_ens.get(ens_name, 0) + record[value_field]
+    aggregates['position'] = end_position(cursor, 'enriched')
+
+    tmp_path = f'{AGGREGATES_PATH}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(aggregates, file)
+    os.replace(tmp_path, AGGREGATES_PATH)
+    return aggregates
+
+def run_queries(rebuild=False):
     process_logs()
+    publish()
     dir_path = 'query_results/'
-    TABLE = 'boost_data'
 
-    with open(FILE_PATH) as file:
-        data = json.load(file)
+    last_updated = chain.time()
+    aggregates = update_aggregates(load_cursor(), rebuild)
 
-    df = pd.DataFrame(data['data'])
-    last_updated = data['last_updated']
-    conn = duckdb.connect(database=':memory:', read_only=False)
-    conn.register(TABLE, df)
-
-    queries = [
-        (
-            "top_accounts_by_fees_paid.json", 
-            f"SELECT account, account_ens as ens, SUM(fee) AS total_fees_paid FROM {TABLE} GROUP BY account, account_ens ORDER BY total_fees_paid DESC, account"
-        ),
-        (
-            "top_boost_delegates_by_fees_earned.json",
-            f"SELECT boost_delegate, boost_delegate_ens as ens, SUM(fee) AS earned_fees FROM {TABLE} GROUP BY boost_delegate, boost_delegate_ens ORDER BY earned_fees DESC, boost_delegate"
-        ),
-        (
-            "top_accounts_by_total_emissions_claimed.json", 
-            f"SELECT account, account_ens as ens, SUM(adjusted_amount) AS amount FROM {TABLE} GROUP BY account, account_ens ORDER BY amount DESC, account"
-        ),
-        (
-            "top_receivers_by_emissions_claimed.json", 
-            f"SELECT receiver, receiver_ens as ens, SUM(adjusted_amount) AS amount FROM {TABLE} GROUP BY receiver, receiver_ens ORDER BY amount DESC, receiver"
-        )
-    ]
-
-    for file_name, sql in queries:
+    for file_name, field, _, _, column in LEADERBOARDS:
         output_file = f'{dir_path}{file_name}'
-        result = conn.execute(f"{sql}").fetchdf()
-        data = result.to_dict(orient='records')
+        rows = [
+            {field: address, 'ens': ens_name, column: total}
+            for address, by_ens in aggregates['sums'][file_name].items()
+            for ens_name, total in by_ens.items()
+        ]
+        rows.sort(key=lambda row: (-row[column], row[field]))
         output = {
-            'data': data,
+            'data': rows,
             'last_updated': last_updated
         }
         # Write the list of JSON objects as a valid JSON array to the output file
@@ -1,8 +1,11 @@
 
-from brownie import web3, Contract, chain, ZERO_ADDRESS
+from brownie import web3, Contract, chain, ZERO_ADDRESS, multicall
 import constants, utils, requests, json, os, subprocess
+import utils.rpc
+import utils.tokens
+from utils import ens
 from dotenv import load_dotenv
-import time, datetime
+import time, datetime, itertools
 import pandas as pd
 from constants import YEAR, EMISSIONS_START_WEEK
 
@@ -18,38 +21,73 @@ prisma_fee_distributor = Contract(constants.PRISMA_FEE_DISTRIBUTOR)
 ybs_registry = Contract(constants.YBS_REGISTRY)
 current_week = vault.getWeek()
 
+PRISMA = '0xdA47862a83dac0c112BA89c6abC2159b95afd71C'
+MKUSD = '0x4591DBfF62656E7859Afe5e45f6f47D3669fBB28'
+ULTRA = '0x35282d87011f87508D457F08252Bc5bFa52E10A0'
+CRV = '0xD533a949740bb3306d119CC777fa900bA034cd52'
+CVX = '0x4e3FBD56CD56c3e72c1403e103b45Db9da5B9D2B'
+
+# Resolve every price this job needs in a single DefiLlama request
+utils.utils.register_tokens([PRISMA, MKUSD, ULTRA, CRV, CVX, constants.YPRISMA, constants.CVX_PRISMA])
+prices = utils.utils.get_prices([PRISMA, MKUSD, ULTRA])
+
 TOKEN_INFO = {
-    '0xdA47862a83dac0c112BA89c6abC2159b95afd71C': {
+    PRISMA: {
         'symbol':'PRISMA',
         'decimals':'18',
-        'price': utils.utils.get_prices(['0xdA47862a83dac0c112BA89c6abC2159b95afd71C']).get('0xdA47862a83dac0c112BA89c6abC2159b95afd71C', 0),
+        'price': prices.get(PRISMA, 0),
         'token_logo_url': 'https://assets.coingecko.com/coins/images/31520/small/PRISMA_200.png?1696530330'
     },
-    '0x4591DBfF62656E7859Afe5e45f6f47D3669fBB28': {
+    MKUSD: {
         'symbol':'mkUSD',
         'decimals':'18',
-        'price': utils.utils.get_prices(['0x4591DBfF62656E7859Afe5e45f6f47D3669fBB28']).get('0x4591DBfF62656E7859Afe5e45f6f47D3669fBB28', 0),
+        'price': prices.get(MKUSD, 0),
         'token_logo_url': 'https://assets.coingecko.com/coins/images/31519/standard/mkUSD_200.png'
     },
-    '0x35282d87011f87508D457F08252Bc5bFa52E10A0': {
+    ULTRA: {
         'symbol':'ULTRA',
         'decimals':'18',
-        'price': utils.utils.get_prices(['0x35282d87011f87508D457F08252Bc5bFa52E10A0']).get('0x35282d87011f87508D457F08252Bc5bFa52E10A0', 0),
+        'price': prices.get(ULTRA, 0),
         'token_logo_url': 'https://assets.coingecko.com/coins/images/35315/standard/ultra-logo.png'
     },
 }
 
 incentive_voting = Contract(constants.INCENTIVE_VOTING)
 
+VOTES_CACHE_FILE = 'prisma_votes_cache.json'
+MAX_WEEKLY_EMISSION_PCT_ABI = [{
+    'name': 'maxWeeklyEmissionPct', 'type': 'function', 'stateMutability': 'view',
+    'inputs': [], 'outputs': [{'name': '', 'type': 'uint16'}],
+}]
+
+def get_vote_weights(receiver_ids, week, cached=None):
+    """
+    Total and per-receiver weights for a week in one multicall. Only receivers
+    missing from `cached` are read.
+    """
+    cached = cached or {'total_weight': None, 'weights': {}}
+    missing = [r for r in receiver_ids if str(r) not in cached['weights']]
+    if not missing and cached['total_weight'] is not None:
+        return cached
+    with multicall():
+        total_weight = incentive_voting.getTotalWeightAt(week)
+        weights = {r: incentive_voting.getReceiverWeightAt(r, week) for r in missing}
+    return {
+        'total_weight': int(total_weight),
+        'weights': {**cached['weights'], **{str(r): int(w) for r, w in weights.items()}},
+    }
+
 def get_votes():
-    incentive_voting = Contract(constants.INCENTIVE_VOTING)
     receivers = get_all_receivers()
     current_week = incentive_voting.getWeek()
     data = {}
     weekly_emissions = emissions_by_week()
     weekly_emissions = {item['system_week']: item for item in weekly_emissions}
+    # Votes for closed weeks can't change
+    votes_cache = utils.utils.load_from_json(VOTES_CACHE_FILE)
     for week in range(0,current_week):
-        total_weight = incentive_voting.getTotalWeightAt(week)
+        votes_cache[str(week)] = get_vote_weights(receivers, week, votes_cache.get(str(week)))
+        total_weight = votes_cache[str(week)]['total_weight']
         if total_weight == 0:
             continue
         if week not in weekly_emissions:
@@ -65,8 +103,7 @@ def get_votes():
         data[week_str]['_total_weight'] = total_weight
         data[week_str]['_total_emissions'] = emissions
         for r in receivers:
-            receiver_info = {}
-            r_weight = incentive_voting.getReceiverWeightAt(r, week)
+            r_weight = votes_cache[str(week)]['weights'][str(r)]
             pct = r_weight / total_weight
             data[week_str]['receivers'][f'receiver_id_{r}'] = {
                 'weight': r_weight,
@@ -74,6 +111,7 @@ def get_votes():
                 'pct': float(f'{pct*100:,.4f}'),
                 'emissions': int(emissions * pct)
             }
+    utils.utils.write_json_atomic(VOTES_CACHE_FILE, votes_cache)
 
     import json
     f = 'emissions.json'
@@ -82,7 +120,6 @@ def get_votes():
     assert False
 
 def get_all_receivers(week=incentive_voting.getWeek()):
-    incentive_voting = Contract(constants.INCENTIVE_VOTING)
     # Load incentive options
     url = f'https://api.prismafinance.com/api/v1/emissionVotes'
     data = requests.get(url).json()
@@ -99,13 +136,23 @@ def get_all_receivers(week=incentive_voting.getWeek()):
             # name = receiver_data[address]["name"]
             d['name'] = receiver_data[address]["name"]
             new_data[i] = d
-            w = incentive_voting.getReceiverWeightAt(weight["id"], week)
-            t = incentive_voting.getTotalWeightAt(week)
+
+    # Current weights and receiver caps in one round trip
+    votes = get_vote_weights(new_data, week)
+    with multicall():
+        max_pcts = {
+            address: Contract.from_abi('Receiver', address, MAX_WEEKLY_EMISSION_PCT_ABI).maxWeeklyEmissionPct()
+            for address in receiver_data
+        }
+    t = votes['total_weight']
+    for address in receiver_data:
+        for weight in receiver_data[address]['weights']:
+            w = votes['weights'][str(weight["id"])]
             pct = w/t
             try:
-                max = Contract(address).maxWeeklyEmissionPct()
-                alert = '🚨' if (pct * 10_000) > max else ''
-            except:
+                alert = '🚨' if (pct * 10_000) > max_pcts[address] else ''
+            except TypeError:
+                # Receiver has no maxWeeklyEmissionPct; the multicall result is empty
                 alert = ''
             print(f'{weight["id"]} {weight["type"]} {receiver_data[address]["name"]} {address} | New global weight: {pct*100:,.2f} {alert}')
     return new_data
@@ -168,58 +215,28 @@ def stats():
         }
     }
 
+    weekly_cache = get_weekly_cache(last_run_data)
+    stale_weeks = {
+        l: [w for w in range(EMISSIONS_START_WEEK, current_week + 1) if w >= current_week - 1 or str(w) not in weekly_cache.get(l, {})]
+        for l in data['liquid_lockers']
+    }
+    for l, weeks in stale_weeks.items():
+        prefetch_remaining_weekly_boost([data['liquid_lockers'][l]['locker']], weeks)
     for l in data['liquid_lockers'].keys():
         d = data['liquid_lockers'][l]
-        account = d['locker']
+        locker_cache = weekly_cache.setdefault(l, {})
         weekly_data = []
-        boost_fees_cache = {}
-        try:
-            weekly_data_cache = last_run_data['liquid_lockers'][l]['weekly_data']
-            boost_fees_cache = {item['week_number']: item['boost_fees_collected'] for item in weekly_data_cache}
-        except:
-            print(f'Cannot parse past data for week.')
         for target_week in range(EMISSIONS_START_WEEK, current_week + 1):
-            week_data = {}
-            start_block = utils.utils.get_week_start_block(token_locker.address, target_week)
-            end_block = utils.utils.get_week_end_block(token_locker.address, week_number=target_week)
-            start_amt = token_locker.getAccountWeightAt(account, target_week - 1)/52
-            end_amt = token_locker.getAccountWeightAt(account, target_week)/52
-            account_weight = token_locker.getAccountWeightAt(account, target_week)
-            account_weight_start = token_locker.getAccountWeightAt(account, target_week - 1)
-            account_weight_gain = max(0, account_weight - account_weight_start)
-            total_weight = token_locker.getTotalWeightAt(target_week)
-            total_weight_start = token_locker.getTotalWeightAt(target_week - 1)
-            total_weight_gain = max(0, total_weight - total_weight_start)
-            global_weight_ratio = 0 if total_weight == 0 else account_weight / total_weight # Gov Share
-            adjusted_weight_capture = 0 if total_weight_gain == 0 else account_weight_gain / total_weight_gain / global_weight_ratio
-            
-            week_data['week_number'] = target_week
-            week_data['peg'] = get_peg(d['pool'], block=end_block)
-            week_data['lock_gain'] = end_amt - start_amt
-            week_data['current_boost_multiplier'] = get_boost(account, target_week, block=end_block)
-            week_data['global_weight_ratio'] = global_weight_ratio
-            week_data['adjusted_weight_capture'] = adjusted_weight_capture
-            week_data['global_weight'] = total_weight
-            week_data['weight']= account_weight
-            week_data['remaining_boost_data'] = get_remaining_weekly_boost(account, target_week)
-            
-            # Here we do some work to pull older data from cache, rather than query it.
-            if (
-                target_week in [current_week, current_week - 1] or # We want to refresh last two weeks in case of overwrite.
-                len(boost_fees_cache) == 0 
-                or not target_week in boost_fees_cache
-            ):
-                df = get_boost_delegation_fees(account, target_week)
-                earned_fees = df['earned_fees'].iloc[0] if not df.empty else 0
-                week_data['boost_fees_collected'] = earned_fees
+            # Finalized weeks never change; refresh last two weeks in case of overwrite.
+            if target_week not in stale_weeks[l]:
+                week_data = locker_cache[str(target_week)]
             else:
-                week_data['boost_fees_collected'] = boost_fees_cache[target_week]
-
-            weekly_data.append(week_data)
+                week_data = get_locker_week_data(d['locker'], d['pool'], target_week)
+                locker_cache[str(target_week)] = week_data
+            weekly_data.append(dict(week_data))
 
         data['liquid_lockers'][l]['weekly_data'] = weekly_data
-        
-        
+    save_weekly_cache(weekly_cache)
 
     data['liquid_lockers']['cvxPrisma']['current_staking_apr'] = cvxprisma_staking_apr()
     data['liquid_lockers']['cvxPrisma']['current_lp_apr'] = cvxprisma_lp_apr()
@@ -228,11 +245,50 @@ def stats():
 
     return data
 
-def get_remaining_weekly_boost(account, week=current_week):
+def get_locker_week_data(account, pool, target_week):
+    end_block = utils.utils.get_week_end_block(token_locker.address, week_number=target_week)
+    account_weight = token_locker.getAccountWeightAt(account, target_week)
+    account_weight_start = token_locker.getAccountWeightAt(account, target_week - 1)
+    start_amt = account_weight_start/52
+    end_amt = account_weight/52
+    account_weight_gain = max(0, account_weight - account_weight_start)
+    total_weight = token_locker.getTotalWeightAt(target_week)
+    total_weight_start = token_locker.getTotalWeightAt(target_week - 1)
+    total_weight_gain = max(0, total_weight - total_weight_start)
+    global_weight_ratio = 0 if total_weight == 0 else account_weight / total_weight # Gov Share
+    adjusted_weight_capture = 0 if total_weight_gain == 0 else account_weight_gain / total_weight_gain / global_weight_ratio
+
+    week_data = {}
+    week_data['week_number'] = target_week
+    week_data['peg'] = get_peg(pool, block=end_block)
+    week_data['lock_gain'] = end_amt - start_amt
+    week_data['current_boost_multiplier'] = get_boost(account, target_week, block=end_block)
+    week_data['global_weight_ratio'] = global_weight_ratio
+    week_data['adjusted_weight_capture'] = adjusted_weight_capture
+    week_data['global_weight'] = total_weight
+    week_data['weight']= account_weight
+    week_data['remaining_boost_data'] = get_remaining_weekly_boost(account, target_week)
+    df = get_boost_delegation_fees(account, target_week)
+    week_data['boost_fees_collected'] = df['earned_fees'].iloc[0] if not df.empty else 0
+    return week_data
+
+def get_remaining_boost_blocks(week):
     block=height
     if week != current_week:
         block = utils.utils.get_week_end_block(token_locker.address, week)
     start_block = utils.utils.get_week_start_block(token_locker.address, week)
+    return start_block, block
+
+def prefetch_remaining_weekly_boost(accounts, weeks):
+    """Batch the storage reads behind get_boost/get_remaining_weekly_boost for accounts x weeks."""
+    reads = []
+    for week in weeks:
+        start_block, block = get_remaining_boost_blocks(week)
+        reads += [(account, week, b) for account in accounts for b in (start_block, block, height)]
+    prefetch_account_weekly_earned(reads)
+
+def get_remaining_weekly_boost(account, week=current_week):
+    start_block, block = get_remaining_boost_blocks(week)
     
     week_start_data = get_maxboost_and_decay(account, week, block=start_block)
     week_end_data = get_maxboost_and_decay(account, week, block=block)
@@ -264,42 +320,77 @@ def get_remaining_weekly_boost(account, week=current_week):
     }
     return remaining_boost_data
 
+FORWARDERS_FILE = 'prisma_forwarders.json'
+FEE_CALLBACK_ABI = [{
+    'name': 'getFeePct', 'type': 'function', 'stateMutability': 'view',
+    'inputs': [
+        {'name': 'claimant', 'type': 'address'},
+        {'name': 'receiver', 'type': 'address'},
+        {'name': 'boostDelegate', 'type': 'address'},
+        {'name': 'amount', 'type': 'uint256'},
+        {'name': 'previousAmount', 'type': 'uint256'},
+        {'name': 'totalWeeklyEmissions', 'type': 'uint256'},
+    ],
+    'outputs': [{'name': 'feePct', 'type': 'uint256'}],
+}]
+
+def get_forwarder_registry(factory):
+    """Every delegate that has configured a forwarder, updated from the last scanned block."""
+    registry = utils.utils.load_from_json(FORWARDERS_FILE)
+    if not registry:
+        registry = {
+            'last_block': utils.utils.contract_creation_block(factory.address) - 1,
+            'delegates': [],
+        }
+    if registry['last_block'] < height:
+        logs = factory.events.ForwarderConfigured.get_logs(fromBlock=registry['last_block'] + 1, toBlock=height)
+        for log in logs:
+            d = log.args['boostDelegate']
+            if d not in registry['delegates']:
+                registry['delegates'].append(d)
+        registry['last_block'] = height
+        utils.utils.write_json_atomic(FORWARDERS_FILE, registry)
+    return registry['delegates']
+
 def get_active_forwarders():
-    ens_data = utils.utils.load_from_json('data/ens_cache.json')
     week = vault.getWeek()
     factory = Contract(constants.BOOST_FACTORY)
-    # logs = utils.utils.get_logs_chunked(factory, 'ForwarderConfigured')
-    creation_block = utils.utils.contract_creation_block(factory.address)
-    logs = factory.events.ForwarderConfigured.get_logs(fromBlock=creation_block)
-    fee = 0
-    active_delegates = []
-    for log in logs:
-        d = log.args['boostDelegate']
-        # fwd = Contract(factory.forwarder(d))
-        if d not in active_delegates and factory.isForwarderActive(d):
-            active_delegates.append(d)
+    delegates = get_forwarder_registry(factory)
+
+    with multicall():
+        status = {d: (factory.isForwarderActive(d), factory.feeCallback(d)) for d in delegates}
+    status = {
+        d: (bool(utils.rpc.multicall_value(active)), str(utils.rpc.multicall_value(callback)))
+        for d, (active, callback) in status.items()
+    }
+    active_delegates = [d for d in delegates if status[d][0]]
+
+    with multicall():
+        fees = {}
+        for d in active_delegates:
+            fee_callback = status[d][1]
+            if fee_callback == ZERO_ADDRESS:
+                fees[d] = vault.boostDelegation(d)
+            else:
+                fees[d] = Contract.from_abi('FeeCallback', fee_callback, FEE_CALLBACK_ABI).getFeePct(
+                    ZERO_ADDRESS,
+                    ZERO_ADDRESS,
+                    d,
+                    1_000e18,
+                    0,
+                    0,
+                )
+    ens_names = ens.resolve(active_delegates, cache_file='data/ens_cache.json')
 
+    prefetch_remaining_weekly_boost(active_delegates, [week])
     active_delegate_list = []
     for d in active_delegates:
         boost_data = get_remaining_weekly_boost(d, week)
-        fee_callback = factory.feeCallback(d)
-        if fee_callback == ZERO_ADDRESS:
-            fee = Contract(constants.VAULT).boostDelegation(d)['feePct']
-        else:
-            fee_callback = Contract(fee_callback)
-            fee = fee_callback.getFeePct(
-                ZERO_ADDRESS,
-                ZERO_ADDRESS,
-                d,
-                1_000e18,
-                0,
-                0,
-            )
-        boost_data['fee'] = fee
+        fee = utils.rpc.multicall_value(fees[d])
+        fee = fee['feePct'] if status[d][1] == ZERO_ADDRESS else fee
+        boost_data['fee'] = int(fee)
         boost_data['boost_delegate'] = d
-        boost_data['delegate_ens'] = ''
-        if d in ens_data and not ens_data[d] is None:
-            boost_data['delegate_ens'] = ens_data[d]
+        boost_data['delegate_ens'] = ens_names[d]
         active_delegate_list.append(boost_data)
     
     return active_delegate_list
@@ -325,16 +416,31 @@ def get_maxboost_and_decay(user, week, block=height):
     calculator = Contract(vault.boostCalculator(block_identifier=block))
     return calculator.getClaimableWithBoost(user, account_weekly_earned, total_weekly).dict()
 
-def get_account_weekly_earned(user, week, block=height):
+ACCOUNT_WEEKLY_EARNED_SLOT = 0x9005
+_ACCOUNT_SLOT_BASES = {}    # user -> base storage key of accountWeeklyEarned[user]
+_STORAGE = {}               # (address, slot, block) -> raw slot value
+
+def account_weekly_earned_slot(user, week):
     # Data we need is in the contract at the `accountWeeklyEarned` mapping
     # But since that variable is not public, we need to fetch directly from storage slot
-    # Below we compute accountWeeklyEarned storage key
-    key = web3.keccak(
-        hexstr="00" * 12
-        + user[2:]
-        + "0000000000000000000000000000000000000000000000000000000000009005"
-    )
-    data = int(web3.eth.get_storage_at(vault.address, int(key.hex(), 16) + week // 2, block_identifier=block).hex(), 16)
+    # Two weeks are packed per slot (uint128 each)
+    if user not in _ACCOUNT_SLOT_BASES:
+        key = web3.keccak(hexstr="00" * 12 + user[2:] + f"{ACCOUNT_WEEKLY_EARNED_SLOT:064x}")
+        _ACCOUNT_SLOT_BASES[user] = int(key.hex(), 16)
+    return _ACCOUNT_SLOT_BASES[user] + week // 2
+
+def prefetch_account_weekly_earned(reads):
+    """Load the storage slots for many (user, week, block) reads in batched requests."""
+    wanted = {(vault.address, account_weekly_earned_slot(user, week), block) for user, week, block in reads}
+    missing = [read for read in wanted if read not in _STORAGE]
+    if missing:
+        _STORAGE.update(utils.rpc.get_storage_at(missing))
+
+def get_account_weekly_earned(user, week, block=height):
+    read = (vault.address, account_weekly_earned_slot(user, week), block)
+    if read not in _STORAGE:
+        _STORAGE[read] = int(web3.eth.get_storage_at(read[0], read[1], block_identifier=block).hex(), 16)
+    data = _STORAGE[read]
     
     if week % 2:
         account_weekly_earned = data >> 128
@@ -352,32 +458,51 @@ def get_peg(pool, amt=100, block=chain.height):
         price = 0
     return price
 
+MAX_REWARD_SLOTS = 200
+REWARD_SLOT_BATCH = 10
+
+def get_reward_schedule(stake_contract, block=chain.height):
+    """
+    Reward tokens of a staking contract with their rewardData and the total
+    supply. Slots are read REWARD_SLOT_BATCH at a time via multicall until the
+    first empty one.
+    """
+    reward_tokens = []
+    while len(reward_tokens) < MAX_REWARD_SLOTS:
+        start = len(reward_tokens)
+        with multicall(block_identifier=block):
+            batch = [stake_contract.rewardTokens(i) for i in range(start, start + REWARD_SLOT_BATCH)]
+        # Reverted calls (past the end of the array) come back empty
+        found = list(itertools.takewhile(bool, batch))
+        reward_tokens += [str(token) for token in found]
+        if len(found) < len(batch):
+            break
+
+    with multicall(block_identifier=block):
+        supply = stake_contract.totalSupply()
+        reward_data = {token: stake_contract.rewardData(token) for token in reward_tokens}
+    return {
+        'supply': int(supply),
+        'rewards': {token: data.dict() for token, data in reward_data.items()},
+    }
+
 def cvxprisma_staking_apr(block=chain.height):
     stake_contract = Contract('0x0c73f1cFd5C9dFc150C8707Aa47Acbd14F0BE108')
     apr = 0
     
-    reward_tokens = []
-    supply = stake_contract.totalSupply(block_identifier=block)
-    for i in range(0,200):
-        try:
-            token = stake_contract.rewardTokens(i)
-            reward_tokens.append(token)
-        except:
-            break
+    schedule = get_reward_schedule(stake_contract, block)
+    supply = schedule['supply']
+    reward_tokens = list(schedule['rewards'])
 
-    # Query DefiLlama for all of our coin prices
     cvxprisma = stake_contract.cvxprisma()
-    coins = ','.join(f'ethereum:{k}' for k in reward_tokens + [cvxprisma])
-    url = f'https://coins.llama.fi/prices/current/{coins}?searchWidth=6h'
-    response = requests.get(url).json()['coins']
-    response = {key.replace('ethereum:', ''): value for key, value in response.items()}
-    price_stake = response[cvxprisma]['price']
+    prices = utils.utils.get_prices(reward_tokens + [cvxprisma], search_width='6h')
+    price_stake = prices[cvxprisma]
 
     for token in reward_tokens:
-        data = stake_contract.rewardData(token).dict()
+        data = schedule['rewards'][token]
         if chain.time() > data['periodFinish']:
             continue
-        price_reward = response[token]['price']
+        price_reward = prices[token]
         reward_apr = data['rewardRate'] / 1e18 * price_reward * YEAR / (price_stake * supply / 1e18)
         apr += reward_apr
 
@@ -388,69 +513,44 @@ def yprisma_staking_apr(block=chain.height):
     mkusd = '0x4591DBfF62656E7859Afe5e45f6f47D3669fBB28'
     staking_token = constants.YPRISMA
 
-    # Query DefiLlama for all of our coin prices
-    coins = ','.join(f'ethereum:{k}' for k in [mkusd, staking_token])
-    url = f'https://coins.llama.fi/prices/current/{coins}?searchWidth=40h'
-    response = requests.get(url).json()['coins']
-    response = {key.replace('ethereum:', ''): value for key, value in response.items()}
-    price_staking_token = response[staking_token]['price']
-    price_reward_token = response[mkusd]['price']
+    prices = utils.utils.get_prices([mkusd, staking_token])
+    price_staking_token = prices[staking_token]
+    price_reward_token = prices[mkusd]
 
     deployment = ybs_registry.deployments(constants.YPRISMA)
-    utils = Contract(deployment['utilities'])
+    ybs_utils = Contract(deployment['utilities'])
 
-    global_projected_apr = utils.getGlobalProjectedApr(price_staking_token*1e18, price_reward_token*1e18) / 1e18
-    global_active_apr = utils.getGlobalActiveApr(price_staking_token*1e18, price_reward_token*1e18) / 1e18
+    global_projected_apr = ybs_utils.getGlobalProjectedApr(price_staking_token*1e18, price_reward_token*1e18) / 1e18
+    global_active_apr = ybs_utils.getGlobalActiveApr(price_staking_token*1e18, price_reward_token*1e18) / 1e18
 
     return global_projected_apr if global_projected_apr != 0 else global_active_apr
 
-def yprisma_lp_apr(block=chain.height):
-    receiver = Contract('0xb8Fa880840a64c25318989B907cCb58FD7A324Df')
+def receiver_lp_apr(receiver_address, rewards, block=chain.height):
+    """Reward APR of a curve LP emission receiver; reads batched in one multicall."""
+    receiver = Contract(receiver_address)
     lp = Contract(receiver.lpToken())
-    ll_price = lp.price_oracle()
-    lp_value_to_prisma = lp.calc_withdraw_one_coin(1e18,0) / 1e18
-    prisma = '0xdA47862a83dac0c112BA89c6abC2159b95afd71C'
-    crv = '0xD533a949740bb3306d119CC777fa900bA034cd52'
-    cvx = '0x4e3FBD56CD56c3e72c1403e103b45Db9da5B9D2B'
-
-    rewards = [prisma, crv, cvx]
+    with multicall(block_identifier=block):
+        lp_value_to_prisma = lp.calc_withdraw_one_coin(1e18,0)
+        reward_rates = [receiver.rewardRate(i) for i in range(len(rewards))]
+        total_supply = receiver.totalSupply()
 
-    prices = utils.utils.get_prices(rewards)
-
-    prices[lp.address] = lp_value_to_prisma * prices[prisma]
+    prices = utils.utils.get_prices([PRISMA] + rewards)
+    lp_price = lp_value_to_prisma / 1e18 * prices[PRISMA]
 
     reward_apr = 0
-    for i, reward in enumerate(rewards):
+    for reward, rate in zip(rewards, reward_rates):
         reward_apr += (
-            receiver.rewardRate(i) / 1e18 * prices[reward] * YEAR /
-            (prices[lp.address] * receiver.totalSupply() / 1e18)
+            rate / 1e18 * prices[reward] * YEAR /
+            (lp_price * total_supply / 1e18)
         )
 
     return reward_apr
 
-def cvxprisma_lp_apr(block=chain.height):
-    receiver = Contract('0xd91fBa4919b7BF3B757320ea48bA102F543dE341')
-    lp = Contract(receiver.lpToken())
-    ll_price = lp.price_oracle()
-    lp_value_to_prisma = lp.calc_withdraw_one_coin(1e18,0) / 1e18
-    prisma = '0xdA47862a83dac0c112BA89c6abC2159b95afd71C'
-    crv = '0xD533a949740bb3306d119CC777fa900bA034cd52'
-    cvx = '0x4e3FBD56CD56c3e72c1403e103b45Db9da5B9D2B'
-
-    rewards = [prisma, crv, cvx]
-
-    prices = utils.utils.get_prices(rewards)
-    
-    prices[lp.address] = lp_value_to_prisma * prices[prisma]
-
-    reward_apr = 0
-    for i, reward in enumerate(rewards):
-        reward_apr += (
-            receiver.rewardRate(i) / 1e18 * prices[reward] * YEAR /
-            (prices[lp.address] * receiver.totalSupply() / 1e18)
-        )
+def yprisma_lp_apr(block=chain.height):
+    return receiver_lp_apr('0xb8Fa880840a64c25318989B907cCb58FD7A324Df', [PRISMA, CRV, CVX], block)
 
-    return reward_apr
+def cvxprisma_lp_apr(block=chain.height):
+    return receiver_lp_apr('0xd91fBa4919b7BF3B757320ea48bA102F543dE341', [PRISMA, CRV, CVX], block)
 
 def get_boost_delegation_fees_old(account, start_block=0, end_block=0):
     start_block = 18501009 if start_block == 0 else start_block
@@ -492,13 +592,14 @@ def xget_fee_distributions():
     # logs = utils.utils.get_logs_chunked(prisma_fee_distributor, 'FeesReceived')
     creation_block = utils.utils.contract_creation_block(prisma_fee_distributor.address)
     logs = prisma_fee_distributor.events.FeesReceived.get_logs(fromBlock=creation_block)
+    metadata = utils.tokens.get_token_metadata({l.args.token for l in logs})
     fee_data = {}
     for l in logs:
         log_data = l.args
         week = log_data.week + 1
         if week not in fee_data:
             fee_data[week] = []
-        amount = log_data.amount / 10 ** Contract(log_data.token).decimals()
+        amount = log_data.amount / 10 ** metadata[log_data.token]['decimals']
         value = 0
         try:
             value = TOKEN_INFO[log_data.token]['price'] * amount
@@ -516,108 +617,156 @@ def xget_fee_distributions():
         )
     return fee_data
 
+FEE_DISTRIBUTIONS_FILE = 'prisma_fee_distributions.json'
+
 def get_fee_distributions():
     """
-    Returns a dict with keys system_week and values array of distribution dicts
+    Returns a dict with keys system_week and values array of distribution dicts.
+    FeesReceived logs are scanned from the block after the last run's scan.
     """
     # logs = utils.utils.get_logs_chunked(prisma_fee_distributor, 'FeesReceived')
-    current_week = prisma_fee_distributor.getWeek()
-    cache_data = get_last_run_data()
-    target_week=0
-    buffer = 3
-    if 'emissions_schedule' in cache_data:
-        target_week = cache_data['emissions_schedule'][-buffer]['system_week']
-        cache_data = cache_data['emissions_schedule'][:-buffer]
-    new_dict = {}
-    for item in cache_data:
-        system_week = item["system_week"]
-        distros = item["protocol_fee_distribution"]["distros"]
-        if system_week in new_dict:
-            new_dict[system_week].extend(distros)
-        else:
-            new_dict[system_week] = distros
-    fee_data = new_dict
-    target_week = 40 if target_week == 0 else target_week
-    start_block = utils.utils.get_week_start_block(token_locker.address, target_week-1)
-    # creation_block = utils.utils.contract_creation_block(prisma_fee_distributor.address)
-    logs = prisma_fee_distributor.events.FeesReceived.get_logs(fromBlock=start_block-1)
-    for l in logs:
-        log_data = l.args
-        week = log_data.week + 1 # Become claimable in following week
-        if week not in fee_data:
-            fee_data[week] = []
-        amount = log_data.amount / 10 ** Contract(log_data.token).decimals()
-        value = 0
-        try:
-            value = amount #* TOKEN_INFO[log_data.token]['price'] # * amount
-        except:
+    cursor = utils.utils.load_from_json(FEE_DISTRIBUTIONS_FILE)
+    if cursor:
+        fee_data = {int(week): distros for week, distros in cursor['fee_data'].items()}
+        start_block = cursor['last_block'] + 1
+    else:
+        # First run: seed from the last published data, re-scanning its last weeks
+        cache_data = get_last_run_data()
+        target_week=0
+        buffer = 3
+        if 'emissions_schedule' in cache_data:
+            target_week = cache_data['emissions_schedule'][-buffer]['system_week']
+            cache_data = cache_data['emissions_schedule'][:-buffer]
+        new_dict = {}
+        for item in cache_data:
+            system_week = item["system_week"]
+            distros = item["protocol_fee_distribution"]["distros"]
+            if system_week in new_dict:
+                new_dict[system_week].extend(distros)
+            else:
+                new_dict[system_week] = distros
+        fee_data = new_dict
+        target_week = 40 if target_week == 0 else target_week
+        start_block = utils.utils.get_week_start_block(token_locker.address, target_week-1) - 1
+
+    if start_block <= height:
+        logs = prisma_fee_distributor.events.FeesReceived.get_logs(fromBlock=start_block, toBlock=height)
+        metadata = utils.tokens.get_token_metadata({l.args.token for l in logs})
+        for l in logs:
+            log_data = l.args
+            week = log_data.week + 1 # Become claimable in following week
+            if week not in fee_data:
+                fee_data[week] = []
+            amount = log_data.amount / 10 ** metadata[log_data.token]['decimals']
             value = 0
+            try:
+                value = amount #* TOKEN_INFO[log_data.token]['price'] # * amount
+            except:
+                value = 0
+
+            fee_data[week].append(
+                {
+                    'token':log_data.token,
+                    'amount': amount,
+                    'value': value,
+                    'token_price': TOKEN_INFO[log_data.token]['price'],
+                    'token_logo_url': TOKEN_INFO[log_data.token]['token_logo_url'],
+                    'symbol': TOKEN_INFO[log_data.token]['symbol']
+                }
+            )
+        utils.utils.write_json_atomic(FEE_DISTRIBUTIONS_FILE, {'last_block': height, 'fee_data': fee_data})
+    return fee_data
 
-        fee_data[week].append(
-            {
-                'token':log_data.token,
-                'amount': amount,
-                'value': value,
-                'token_price': TOKEN_INFO[log_data.token]['price'],
-                'token_logo_url': TOKEN_INFO[log_data.token]['token_logo_url'],
-                'symbol': TOKEN_INFO[log_data.token]['symbol']
+EMISSIONS_CACHE_FILE = 'prisma_emissions_cache.json'
+_EMISSIONS_BY_WEEK = None   # shared by main() and get_votes() within a run
+
+def read_emissions_state(blocks):
+    """Emissions schedule and vault state used by emissions_by_week, one multicall per distinct block."""
+    state = {}
+    for block in sorted(set(blocks)):
+        with multicall(block_identifier=block):
+            calls = {
+                'lock_weeks': emissions_schedule.lockWeeks(),
+                'lock_decay_weeks': emissions_schedule.lockDecayWeeks(),
+                'weekly_pct': emissions_schedule.weeklyPct(),
+                'pct_schedule': emissions_schedule.getWeeklyPctSchedule(),
+                'unallocated_total': vault.unallocatedTotal(),
+                'penalty_withdrawals_enabled': token_locker.penaltyWithdrawalsEnabled(),
             }
-        )
-    return fee_data
+        state[block] = {
+            'lock_weeks': int(calls['lock_weeks']),
+            'lock_decay_weeks': int(calls['lock_decay_weeks']),
+            'weekly_pct': int(calls['weekly_pct']),
+            'next_update': tuple(int(x) for x in calls['pct_schedule'][-1]),
+            'unallocated_total': int(calls['unallocated_total']),
+            'penalty_withdrawals_enabled': bool(calls['penalty_withdrawals_enabled']),
+        }
+    return state
 
 def emissions_by_week():
+    """
+    Weekly emissions rows. Closed weeks are persisted in EMISSIONS_CACHE_FILE
+    (None marks a closed week without emissions); only the live and projected
+    weeks are read from chain. Protocol fees are attached fresh each run.
+    """
+    global _EMISSIONS_BY_WEEK
+    if _EMISSIONS_BY_WEEK is not None:
+        return _EMISSIONS_BY_WEEK
     MAX_PCT = 10_000
     fee_distro_by_week = get_fee_distributions()
     current_week = vault.getWeek()
-    emissions_week = 0
-    weeks = []
     net_emissions_notes = {
         0: 'Example note to appear as tooltip.',
         12: 'During first week, all claims were 2x boosted. Therefore, nothing was returned to vault as unallocated.',
         15: 'Biggest week of returned emissions. Largely due to this chad making a massive unboosted claim (1x boost). [Transaction](https://etherscan.io/tx/0xbc37f09cd66896e9f1e3f2b3f56ce5783cb1438ef0010da6396e617b738bdbc4)',
     }
-    for i in range(0, current_week + 2):
-        end_block = chain.height
+    cache = utils.utils.load_from_json(EMISSIONS_CACHE_FILE)
+    todo = [i for i in range(0, current_week + 2) if str(i) not in cache]
+
+    with multicall():
+        weekly_emissions = {i: vault.weeklyEmissions(i) for i in todo}
+    weekly_emissions = {i: int(v) for i, v in weekly_emissions.items()}
+
+    end_blocks, start_blocks = {}, {}
+    for i in todo:
+        end_blocks[i] = chain.height
+        if weekly_emissions[i] > 0:
+            end_blocks[i] = utils.utils.get_week_end_block(token_locker.address, i)
+        elif i < current_week:
+            cache[str(i)] = None
+            continue
+        if i <= current_week:
+            start_blocks[i] = utils.utils.get_week_start_block(token_locker.address, i)
+    state = read_emissions_state(list(end_blocks.values()) + list(start_blocks.values()))
+
+    for i in todo:
+        if str(i) in cache:
+            continue
+        end_block = end_blocks[i]
+        end_state = state[end_block]
         rate_change = False            
         weekly_data = {}
-        lock_weeks = 0
-        if vault.weeklyEmissions(i) > 0:
-            end_block = utils.utils.get_week_end_block(token_locker.address, i)
-            lock_weeks = emissions_schedule.lockWeeks(block_identifier=end_block)
-            emissions_week += 1
+        lock_weeks = end_state['lock_weeks']
+        pct = end_state['weekly_pct']
+        next_update = end_state['next_update']
+        if next_update[0] == i:
+            pct = next_update[1]
+            rate_change = True
+        if weekly_emissions[i] > 0:
             weekly_data['projected'] = False
-            weekly_data['allocated_emissions'] = vault.weeklyEmissions(i)/1e18
-            weekly_data['emissions_week'] = emissions_week
-            weekly_data['system_week'] = i
-            pct = emissions_schedule.weeklyPct(block_identifier=end_block)
-            next_update = emissions_schedule.getWeeklyPctSchedule(block_identifier=end_block)[-1]
-            if next_update[0] == i:
-                pct = next_update[1]
-                rate_change = True
+            weekly_data['allocated_emissions'] = weekly_emissions[i]/1e18
         else:
-            if i < current_week:
-                continue
-            emissions_week += 1
             weekly_data['projected'] = True
-            weekly_data['emissions_week'] = emissions_week
-            weekly_data['system_week'] = i
             # Calc projected
-            decay_weeks = emissions_schedule.lockDecayWeeks(block_identifier=end_block)
-            lock_weeks = emissions_schedule.lockWeeks(block_identifier=end_block)
+            decay_weeks = end_state['lock_decay_weeks']
             if lock_weeks > 0 and i % decay_weeks == 0:
                 lock_weeks -= 1
-            
-            unallocated_total = vault.unallocatedTotal(block_identifier=end_block)
-            pct = emissions_schedule.weeklyPct(block_identifier=end_block)
-            next_update = emissions_schedule.getWeeklyPctSchedule(block_identifier=end_block)[-1]
-            if next_update[0] == i:
-                pct = next_update[1]
-                rate_change = True
-            weekly_data['allocated_emissions'] = (unallocated_total * pct) / MAX_PCT / 1e18
+            weekly_data['allocated_emissions'] = (end_state['unallocated_total'] * pct) / MAX_PCT / 1e18
+        weekly_data['system_week'] = i
 
         if i <= current_week:
-            unallocated_total_start = vault.unallocatedTotal(block_identifier=utils.utils.get_week_start_block(token_locker.address, i)) / 1e18
-            unallocated_total_end = vault.unallocatedTotal(block_identifier=end_block) / 1e18
+            unallocated_total_start = state[start_blocks[i]]['unallocated_total'] / 1e18
+            unallocated_total_end = end_state['unallocated_total'] / 1e18
             # First four weeks of emissions were special due to init params. They did not impact the unallocated supply.
             if i in [12, 13, 14, 15]:
                 weekly_data['net_emissions_returned'] = unallocated_total_end - unallocated_total_start
@@ -629,6 +778,30 @@ def emissions_by_week():
         else:
             weekly_data['net_emissions_returned'] = 0
 
+        weekly_data['lock_weeks'] = lock_weeks
+        weekly_data['emissions_rate_change_week'] = rate_change
+        weekly_data['emissions_rate_pct'] = pct
+        weekly_data['penalty_pct'] = 0 if not end_state['penalty_withdrawals_enabled'] else (
+            lock_weeks / 52 * 100
+        )
+        weekly_data['net_emissions_notes'] = '' if not i in net_emissions_notes else net_emissions_notes[i]
+        weekly_data['week_start_ts'] = utils.utils.get_week_start_ts(token_locker.address, i)
+        weekly_data['week_end_ts'] = utils.utils.get_week_end_ts(token_locker.address, i)
+        cache[str(i)] = weekly_data
+
+    # Only closed weeks are immutable
+    utils.utils.write_json_atomic(
+        EMISSIONS_CACHE_FILE, {w: row for w, row in cache.items() if int(w) < current_week}
+    )
+
+    weeks = []
+    emissions_week = 0
+    for i in range(0, current_week + 2):
+        if cache[str(i)] is None:
+            continue
+        emissions_week += 1
+        weekly_data = dict(cache[str(i)])
+        weekly_data['emissions_week'] = emissions_week
         total_protocol_fees = 0
         if i in fee_distro_by_week:
             for x in fee_distro_by_week[i]:
@@ -638,16 +811,8 @@ def emissions_by_week():
             'distros': [] if i not in fee_distro_by_week else fee_distro_by_week[i]
         }
         weekly_data['protocol_fee_distribution'] = protocol_fee_distribution
-        weekly_data['lock_weeks'] = lock_weeks
-        weekly_data['emissions_rate_change_week'] = rate_change
-        weekly_data['emissions_rate_pct'] = pct
-        weekly_data['penalty_pct'] = 0 if not token_locker.penaltyWithdrawalsEnabled(block_identifier=end_block) else (
-            lock_weeks / 52 * 100
-        )
-        weekly_data['net_emissions_notes'] = '' if not i in net_emissions_notes else net_emissions_notes[i]
-        weekly_data['week_start_ts'] = utils.utils.get_week_start_ts(token_locker.address, i)
-        weekly_data['week_end_ts'] = utils.utils.get_week_end_ts(token_locker.address, i)
         weeks.append(weekly_data)
+    _EMISSIONS_BY_WEEK = weeks
 
     # Creating a DataFrame from the list of dictionaries
     df = pd.DataFrame(weeks)
@@ -717,6 +882,29 @@ def get_last_run_data():
         return {}
     return result
 
+WEEKLY_CACHE_FILE = 'prisma_weekly_cache.json'
+
+def get_weekly_cache(last_run_data={}):
+    """
+    Per-locker, per-week stats keyed by week number. Seeded from the last run's
+    output the first time, so existing history doesn't need to be re-queried.
+    """
+    cache = utils.utils.load_from_json(WEEKLY_CACHE_FILE)
+    if cache:
+        return cache
+    try:
+        for locker, locker_data in last_run_data['liquid_lockers'].items():
+            cache[locker] = {
+                str(item['week_number']): {k: v for k, v in item.items() if k != 'liquid_locker_weekly_dominance'}
+                for item in locker_data['weekly_data']
+            }
+    except (KeyError, TypeError):
+        print(f'Cannot parse past data for week.')
+    return cache
+
+def save_weekly_cache(cache):
+    utils.utils.write_json_atomic(WEEKLY_CACHE_FILE, cache)
+
 def write_data_as_json(data, project_directory="", json_filename=None):
     if json_filename is None:
         json_filename = os.getenv('PRISMA_JSON_FILE', 'default.json')
@@ -1,21 +1,13 @@
 from brownie import Contract, chain, web3
 import pandas as pd
-import duckdb
-import requests
 import utils
 from constants import VAULT
 
 vault = Contract(VAULT)
 
 def query():
-    # fetch raw txn data from wavey repo and put into dataframe
-    url = 'https://raw.githubusercontent.com/wavey0x/open-data/master/raw_boost_data.json'
-    data = requests.get(url).json()['data']
-    df = pd.DataFrame(data)
-
-    # load data into virtual db
-    con = duckdb.connect(database=':memory:')
-    con.register('boost_data', df)
+    # open the local boost_data mirror (or the published data if there is none)
+    con = utils.utils.boost_data_connection()
 
     # Write any SQL to query the raw data
 
@@ -118,14 +110,8 @@ def query_claim_data_pct():
 
 
 
-    # fetch raw txn data from wavey repo and put into dataframe
-    url = 'https://raw.githubusercontent.com/wavey0x/open-data/master/raw_boost_data.json'
-    data = requests.get(url).json()['data']
-    df = pd.DataFrame(data)
-
-    # load data into virtual db
-    con = duckdb.connect(database=':memory:')
-    con.register('boost_data', df)
+    # open the local boost_data mirror (or the published data if there is none)
+    con = utils.utils.boost_data_connection()
 
     # Write any SQL to query the raw data
 
@@ -174,14 +160,8 @@ def query_claim_data_amounts():
     # Combine all week queries with UNION ALL
     final_query = "\nUNION ALL\n".join(sql_queries)
 
-    # fetch raw txn data from wavey repo and put into dataframe
-    url = 'https://raw.githubusercontent.com/wavey0x/open-data/master/raw_boost_data.json'
-    data = requests.get(url).json()['data']
-    df = pd.DataFrame(data)
-
-    # load data into virtual db
-    con = duckdb.connect(database=':memory:')
-    con.register('boost_data', df)
+    # open the local boost_data mirror (or the published data if there is none)
+    con = utils.utils.boost_data_connection()
 
     # Write any SQL to query the raw data
 
@@ -1,14 +1,23 @@
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
+import os
+import time
 import requests
 from web3 import Web3
 from typing import Optional, Dict
 from brownie import web3, ZERO_ADDRESS, chain, interface
 from .constants import CONTRACTS
-from .contract_names import get_contract_name
+from .contract_names import resolve_names
 from utils.utils import contract_creation_block
 
 SELECTORS = None
+UNKNOWN_SELECTORS = None
+
+FOURBYTE_URL = "https://www.4byte.directory/api/v1/signatures/"
+FOURBYTE_WORKERS = 4
+UNKNOWN_SELECTOR_TTL = 60 * 60 * 24 * 7  # re-ask 4byte about unknown selectors weekly
 
 
 def normalize_selector(selector_hex: str) -> str:
@@ -26,28 +35,57 @@ def get_selectors_path() -> Path:
     project_root = Path(__file__).resolve().parents[2]
     return project_root / "data/selectors.json"
 
+def get_selectors_index_path() -> Path:
+    """Sidecar holding the ABI directory hash and the 4byte negative cache."""
+    return get_selectors_path().with_name("selectors_index.json")
+
+def get_interfaces_dir() -> Path:
+    project_root = Path(__file__).resolve().parents[2]
+    return project_root / "interfaces/resupply"
+
+def hash_interfaces_dir() -> str:
+    """Hash of every ABI file name and contents, used to detect ABI changes."""
+    digest = hashlib.sha1()
+    for json_file in sorted(get_interfaces_dir().glob("*.json")):
+        digest.update(json_file.name.encode())
+        digest.update(json_file.read_bytes())
+    return digest.hexdigest()
+
 def get_selectors() -> Dict[str, str]:
-    """Load the selectors from selectors.json, caching in memory."""
-    global SELECTORS
+    """
+    Load the selector index, caching in memory. ABI-derived selectors are only
+    regenerated when the interfaces directory hash changes.
+    """
+    global SELECTORS, UNKNOWN_SELECTORS
     if SELECTORS is not None:
         return SELECTORS
     selectors_file = get_selectors_path()
-    if not selectors_file.exists():
-        SELECTORS = {}
-        print("No selectors file found.")
-        return SELECTORS
-    with open(selectors_file, 'r') as f:
-        raw_selectors = json.load(f)
-    normalized_selectors = {normalize_selector(k): v for k, v in raw_selectors.items()}
-    if normalized_selectors != raw_selectors:
-        selectors_file.write_text(json.dumps(normalized_selectors, indent=2))
-    SELECTORS = normalized_selectors
+    selectors = {}
+    if selectors_file.exists():
+        with open(selectors_file, 'r') as f:
+            selectors = {normalize_selector(k): v for k, v in json.load(f).items()}
+
+    index = {}
+    index_file = get_selectors_index_path()
+    if index_file.exists():
+        try:
+            index = json.loads(index_file.read_text())
+        except json.JSONDecodeError:
+            index = {}
+    UNKNOWN_SELECTORS = index.get('unknown', {})
+
+    abi_hash = hash_interfaces_dir()
+    if not selectors or index.get('abi_hash') != abi_hash:
+        # Keep 4byte-resolved entries, refresh everything the ABIs define
+        selectors.update(selectors_from_abis())
+        save_selectors(selectors, abi_hash)
+    SELECTORS = selectors
     print(f"Loaded {len(SELECTORS)} selectors from {selectors_file}")
     return SELECTORS
 
 
-def save_selectors(selectors: Dict[str, str]) -> None:
-    """Persist selectors to disk and update cache."""
+def save_selectors(selectors: Dict[str, str], abi_hash: Optional[str] = None) -> None:
+    """Persist selectors and the index sidecar to disk and update cache."""
     global SELECTORS
     selectors_file = get_selectors_path()
     selectors_file.parent.mkdir(exist_ok=True)
@@ -55,52 +93,62 @@ def save_selectors(selectors: Dict[str, str]) -> None:
     selectors_file.write_text(json.dumps(normalized_selectors, indent=2))
     SELECTORS = normalized_selectors
 
+    index_file = get_selectors_index_path()
+    if abi_hash is None and index_file.exists():
+        abi_hash = json.loads(index_file.read_text()).get('abi_hash')
+    index_file.write_text(json.dumps({
+        'abi_hash': abi_hash,
+        'unknown': UNKNOWN_SELECTORS or {},
+    }, indent=2))
+
 def get_function_selector(signature: str) -> str:
     """Generate function selector from function signature"""
     return normalize_selector(Web3.keccak(text=signature)[:4].hex())
 
 def lookup_selector(selector_hex: str) -> Optional[str]:
-    """Look up a function signature by its selector in selectors.json"""
-    selector_hex = normalize_selector(selector_hex)
+    """Look up a function signature by its selector, falling back to 4byte."""
+    return resolve_selectors([selector_hex]).get(normalize_selector(selector_hex))
+
+def resolve_selectors(selector_hexes) -> Dict[str, Optional[str]]:
+    """
+    Resolve many selectors at once. Index misses are sent to 4byte with bounded
+    concurrency; selectors 4byte doesn't know are negatively cached.
+    """
     selectors = get_selectors()
-    signature = selectors.get(selector_hex)
-    
-    if signature:
-        return signature
+    wanted = {normalize_selector(s) for s in selector_hexes}
+    now = time.time()
+    misses = [
+        s for s in wanted
+        if s not in selectors and now - UNKNOWN_SELECTORS.get(s, 0) > UNKNOWN_SELECTOR_TTL
+    ]
+
+    if misses:
+        with ThreadPoolExecutor(max_workers=FOURBYTE_WORKERS) as executor:
+            results = dict(zip(misses, executor.map(fetch_4byte_signature, misses)))
+        for selector_hex, (found, signature) in results.items():
+            if signature:
+                selectors[selector_hex] = signature
+                UNKNOWN_SELECTORS.pop(selector_hex, None)
+            elif found:
+                UNKNOWN_SELECTORS[selector_hex] = now
+        save_selectors(selectors)
 
-    # Regenerate from local ABIs in case selectors.json is stale
-    selectors = generate_selectors()
-    signature = selectors.get(selector_hex)
-    if signature:
-        return signature
+    return {s: selectors.get(s) for s in wanted}
 
-    # Fallback to 4byte API; best-effort, ignore failures
+def fetch_4byte_signature(selector_hex: str):
+    """Return (answered, signature); answered is False when the request failed."""
     try:
-        resp = requests.get(
-            "https://www.4byte.directory/api/v1/signatures/",
-            params={"hex_signature": selector_hex},
-            timeout=5,
-        )
+        resp = requests.get(FOURBYTE_URL, params={"hex_signature": selector_hex}, timeout=5)
         resp.raise_for_status()
         results = resp.json().get("results", [])
-        if results:
-            signature = results[0].get("text_signature")
-            if signature:
-                selectors[selector_hex] = signature
-                save_selectors(selectors)
-                return signature
+        return True, results[0].get("text_signature") if results else None
     except Exception as exc:
         print(f"4byte lookup failed for {selector_hex}: {exc}")
+        return False, None
 
-    return None
-
-def generate_selectors() -> Dict[str, str]:
-    """Generate and save selectors from interface JSONs"""
-    global SELECTORS
-    project_root = Path(__file__).resolve().parents[2]
-    interfaces_dir = project_root / "interfaces/resupply"
-    selectors_file = get_selectors_path()
-
+def selectors_from_abis() -> Dict[str, str]:
+    """Selector -> signature for every function in the interface JSONs"""
+    interfaces_dir = get_interfaces_dir()
     selectors = {}
 
     # Ensure interfaces directory exists
@@ -110,8 +158,6 @@ def generate_selectors() -> Dict[str, str]:
 
     # Process each .json file in the interfaces directory
     for json_file in interfaces_dir.glob("*.json"):
-        contract_name = json_file.stem
-
         with open(json_file, 'r') as f:
             abi = json.load(f)
 
@@ -129,14 +175,16 @@ def generate_selectors() -> Dict[str, str]:
                     selector = get_function_selector(signature)
                     selectors[selector] = f"{signature}"
 
-    # Save selectors to JSON file
-    save_selectors(selectors)
+    return selectors
 
-    print(f"Generated selectors file at {selectors_file}")
-    print(f"Found {len(selectors)} function selectors")
+def generate_selectors() -> Dict[str, str]:
+    """Force a rebuild of the selector index from interface JSONs"""
+    selectors = get_selectors()
+    selectors.update(selectors_from_abis())
+    save_selectors(selectors, hash_interfaces_dir())
 
-    # Update global cache
-    SELECTORS = selectors
+    print(f"Generated selectors file at {get_selectors_path()}")
+    print(f"Found {len(selectors)} function selectors")
 
     return selectors
 
@@ -144,12 +192,27 @@ def generate_selectors() -> Dict[str, str]:
 if __name__ == "__main__":
     generate_selectors()
 
+def authorization_key(entry) -> str:
+    """State key for an authorization: selector, caller and target."""
+    return f"{normalize_selector(entry['selector'][0])}|{entry['caller']}|{entry['target']}"
+
+def replay_state(authorizations):
+    """
+    Map each (selector, caller, target) key to its latest entry in a newest-first
+    list. Entries are referenced by position counted from the oldest entry, which
+    stays stable as newer entries are prepended.
+    """
+    state = {}
+    for position, entry in enumerate(reversed(authorizations)):
+        state[authorization_key(entry)] = position
+    return state
+
 def get_active_authorizations(logs):
     """Return only currently active authorizations from the log list."""
     # Map: (selector_hex, caller, target) -> last log
     last_state = {}
     for entry in logs:
-        key = (entry['selector'][0], entry['caller'], entry['target'])
+        key = authorization_key(entry)
         # Since logs are sorted newest first, only set if not already set
         if key not in last_state:
             last_state[key] = entry
@@ -157,8 +220,33 @@ def get_active_authorizations(logs):
     active = [entry for entry in last_state.values() if entry['authorized']]
     return active
 
+def enrich_authorizations(entries):
+    """Add selector signatures and caller/target names to entries in place."""
+    signatures = resolve_selectors(entry['selector'][0] for entry in entries)
+    names = resolve_names({a for entry in entries for a in (entry['caller'], entry['target'])})
+    missing_selectors = set()
+    for entry in entries:
+        selector_hex = entry['selector'][0]
+        signature = signatures.get(normalize_selector(selector_hex))
+        if signature is None:
+            missing_selectors.add(selector_hex)
+            signature = ""
+        entry['selector'] = (selector_hex, signature)
+
+        # Add contract names for caller and target
+        entry['caller_name'] = names.get(entry['caller'])
+        entry['target_name'] = names.get(entry['target'])
+
+    if missing_selectors:
+        print(f"Warning: {len(missing_selectors)} selectors not found in local cache or 4byte.directory")
+
 def get_all_selectors(current_height=None):
-    """Get all authorization selectors with caching for efficiency. Returns dict with 'all' and 'active'."""
+    """
+    Get all authorization selectors, applying only OperatorSet logs newer than the
+    cached block to the persisted entries and the (selector, caller, target) state
+    map, which points at each key's latest entry in the list.
+    Returns dict with 'all' and 'active'.
+    """
     if not isinstance(current_height, int):
         current_height = chain.height
     
@@ -171,6 +259,7 @@ def get_all_selectors(current_height=None):
     
     # Load existing cache
     cached_authorizations = []
+    state = None
     last_processed_block = CORE_DEPLOY_BLOCK
     
     if cache_path.exists():
@@ -178,12 +267,20 @@ def get_all_selectors(current_height=None):
             with open(cache_path, 'r') as f:
                 cache_data = json.load(f)
                 cached_authorizations = cache_data.get('authorizations', [])
+                state = cache_data.get('state')
                 last_processed_block = cache_data.get('last_processed_block', CORE_DEPLOY_BLOCK)
         except (json.JSONDecodeError, FileNotFoundError):
             last_processed_block = CORE_DEPLOY_BLOCK
 
-    # Load selectors (will use cached version if already loaded)
-    get_selectors()
+    if state is None:
+        # Cache predates the state map: enrich and replay the history once
+        enrich_authorizations(cached_authorizations)
+        state = replay_state(cached_authorizations)
+    else:
+        # Retry selectors that were unknown when their entry was first seen
+        unresolved = [e for e in cached_authorizations if not e['selector'][1]]
+        if unresolved:
+            enrich_authorizations(unresolved)
 
     # Get new events since last processed block
     new_authorizations = []
@@ -191,6 +288,7 @@ def get_all_selectors(current_height=None):
         core = interface.ICore(CONTRACTS["CORE"])
         
         logs = core.events.OperatorSet.get_logs(fromBlock=last_processed_block + 1, toBlock=current_height)
+        timestamps = {block: chain[block].timestamp for block in {log.blockNumber for log in logs}}
         for log in logs:
             selector_hex = web3.to_hex(log.args.selector)
             new_authorizations.append({
@@ -201,54 +299,47 @@ def get_all_selectors(current_height=None):
                 'auth_hook': log.args.authHook,
                 'authorized': log.args.authorized,
                 'target': log.args.target,
-                'timestamp': chain[log.blockNumber].timestamp
+                'timestamp': timestamps[log.blockNumber]
             })
     
-    # Create a set of existing entries to avoid duplicates
-    existing_entries = set()
-    for entry in cached_authorizations:
-        duplicate_key = (entry['txn'], entry['block'], entry['caller'], entry['target'])
-        existing_entries.add(duplicate_key)
-    
-    # Only add truly new entries
-    truly_new_entries = []
-    for entry in new_authorizations:
-        duplicate_key = (entry['txn'], entry['block'], entry['caller'], entry['target'])
-        if duplicate_key not in existing_entries:
-            truly_new_entries.append(entry)
-    
-    # Combine cached and new entries, sort by newest first
-    complete_authorizations = cached_authorizations + truly_new_entries
-    complete_authorizations.sort(key=lambda x: x['timestamp'], reverse=True)
-    
-    # Lookup selectors and add contract names
-    missing_selectors = set()
-    for entry in complete_authorizations:
-        selector_hex = entry['selector'][0]
-        signature = lookup_selector(selector_hex)
-        if signature is None:
-            missing_selectors.add(selector_hex)
-            signature = ""
-        entry['selector'] = (selector_hex, signature)
-
-        # Add contract names for caller and target
-        entry['caller_name'] = get_contract_name(entry['caller'])
-        entry['target_name'] = get_contract_name(entry['target'])
-
-    if missing_selectors:
-        print(f"Warning: {len(missing_selectors)} selectors not found in local cache or 4byte.directory")
+    # Only add truly new entries; overlap is only possible at the boundary block
+    boundary = min((e['block'] for e in new_authorizations), default=current_height + 1)
+    existing_entries = {
+        (e['txn'], e['block'], e['caller'], e['target'])
+        for e in cached_authorizations if e['block'] >= boundary
+    }
+    truly_new_entries = [
+        e for e in new_authorizations
+        if (e['txn'], e['block'], e['caller'], e['target']) not in existing_entries
+    ]
+    enrich_authorizations(truly_new_entries)
+
+    # Logs arrive oldest first; later events overwrite the state for their key
+    for offset, entry in enumerate(truly_new_entries):
+        state[authorization_key(entry)] = len(cached_authorizations) + offset
+
+    # New entries are newer than everything cached; keep the list newest first
+    truly_new_entries.reverse()
+    complete_authorizations = truly_new_entries + cached_authorizations
     
     # Save updated cache
     cache_data = {
         'authorizations': complete_authorizations,
+        'state': state,
         'last_processed_block': current_height
     }
     
     cache_path.parent.mkdir(exist_ok=True)
-    with open(cache_path, 'w') as f:
+    tmp_path = cache_path.with_suffix('.json.tmp')
+    with open(tmp_path, 'w') as f:
         json.dump(cache_data, f, indent=4)
+    os.replace(tmp_path, cache_path)
     
     print(f"Authorizations: {len(complete_authorizations)} total entries, {len(truly_new_entries)} new entries")
-    active_authorizations = get_active_authorizations(complete_authorizations)
+    latest = [complete_authorizations[-1 - position] for position in state.values()]
+    active_authorizations = sorted(
+        (entry for entry in latest if entry['authorized']),
+        key=lambda x: x['timestamp'], reverse=True
+    )
     print(f"Active authorizations: {len(active_authorizations)}")
     return {'all': complete_authorizations, 'active': active_authorizations}
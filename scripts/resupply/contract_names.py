@@ -1,10 +1,14 @@
 import requests
 import json
+from utils import http_cache
 from pathlib import Path
 from typing import Dict, Optional
 
 CONTRACT_NAMES = None
+REFRESHED = False  # API list revalidated during this run
 CACHE_FILE = 'contract_names_cache.json'
+REMOTE_TTL = 60 * 60 * 24
+CONTRACTS_URL = "https://raw.githubusercontent.com/resupplyfi/resupply/refs/heads/main/deployment/contracts.json"
 
 # Hardcoded contract names for addresses not in the GitHub JSON
 HARDCODED_CONTRACTS = {
@@ -43,63 +47,61 @@ def save_cache(contract_names: Dict[str, str]) -> None:
     except:
         pass
 
-def fetch_from_api() -> Dict[str, str]:
-    """Fetch contract names from API and return address->name mapping."""
-    url = "https://raw.githubusercontent.com/resupplyfi/resupply/refs/heads/main/deployment/contracts.json"
-    
+def fetch_from_api(ttl: float = REMOTE_TTL) -> Dict[str, str]:
+    """Fetch contract names from API (through the HTTP cache) as an address->name mapping."""
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        contracts_data = response.json()
-        
         # Invert mapping: address -> name
-        contract_names = {}
-        for name, address in contracts_data.items():
-            contract_names[address.lower()] = name
-        
-        return contract_names
-    except:
+        return http_cache.get_json(
+            CONTRACTS_URL, ttl=ttl,
+            transform=lambda data: {address.lower(): name for name, address in data.items()},
+        )
+    except (requests.exceptions.RequestException, ValueError, AttributeError):
         return {}
 
+def refresh_from_api(contract_names: Dict[str, str], ttl: float = REMOTE_TTL) -> bool:
+    """Merge the API list into contract_names and persist. Returns True on success."""
+    api_data = fetch_from_api(ttl)
+    if not api_data:
+        return False
+    if any(contract_names.get(a) != n for a, n in api_data.items()):
+        contract_names.update(api_data)
+        save_cache(contract_names)
+    return True
+
 def get_contract_names() -> Dict[str, str]:
-    """Get contract names, using cache first then API if needed."""
+    """
+    Lowercase address -> name index merged from the cache file, the API list
+    (refreshed once REMOTE_TTL has passed) and the hardcoded names.
+    """
     global CONTRACT_NAMES
     if CONTRACT_NAMES is not None:
         return CONTRACT_NAMES
-    
-    # Start with cache
-    CONTRACT_NAMES = load_cache()
-    
-    # If cache is empty, fetch from API
-    if not CONTRACT_NAMES:
-        CONTRACT_NAMES = fetch_from_api()
-        if CONTRACT_NAMES:
-            save_cache(CONTRACT_NAMES)
-    
+
+    contract_names = load_cache()
+    refresh_from_api(contract_names)
+
+    # Hardcoded names take precedence
+    contract_names.update(HARDCODED_CONTRACTS)
+    CONTRACT_NAMES = contract_names
     return CONTRACT_NAMES
 
+def resolve_names(addresses) -> Dict[str, Optional[str]]:
+    """
+    Resolve many addresses at once, keyed as passed in. Unknown addresses
+    trigger at most one API refresh per run.
+    """
+    global REFRESHED
+    contract_names = get_contract_names()
+    addresses = [a for a in addresses if a]
+    if not REFRESHED and any(str(a).lower() not in contract_names for a in addresses):
+        # Revalidate the remote list once; unchanged lists cost a 304
+        REFRESHED = True
+        if refresh_from_api(contract_names, ttl=0):
+            contract_names.update(HARDCODED_CONTRACTS)
+    return {a: contract_names.get(str(a).lower()) for a in addresses}
+
 def get_contract_name(address: str) -> Optional[str]:
     """Get contract name for address, fetching from API if not in cache."""
     if not address:
         return None
-    normalized_address = str(address).lower()
-    
-    # Check hardcoded contracts first
-    hardcoded_result = HARDCODED_CONTRACTS.get(normalized_address)
-    if hardcoded_result:
-        return hardcoded_result
-    
-    # Try cache first
-    contract_names = get_contract_names()
-    result = contract_names.get(normalized_address)
-    
-    # If not found and we have cache, try API to get updated data
-    if result is None and contract_names:
-        api_data = fetch_from_api()
-        if api_data:
-            # Update cache with any new items
-            contract_names.update(api_data)
-            save_cache(contract_names)
-            result = contract_names.get(normalized_address)
-    
-    return result
+    return resolve_names([address])[address]
@@ -21,6 +21,7 @@ from config import (
 import requests
 from utils.utils import (
     get_prices,
+    register_tokens,
     closest_block_before_timestamp,
     get_token_logo_url,
     get_coingecko_tokens
@@ -617,6 +618,10 @@ def main():
     # Initialize CoinGecko tokens cache
     get_coingecko_tokens()
 
+    # Register prices needed across stages so they resolve in one request
+    reward_tokens, _ = utils.getInsurancePoolRewardRates()
+    register_tokens([GOV_TOKEN, STABLECOIN, *reward_tokens])
+
     # Get market data
     market_data = get_resupply_pairs_and_collaterals()
 
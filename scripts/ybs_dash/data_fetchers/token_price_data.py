@@ -1,5 +1,6 @@
-from brownie import Contract, ZERO_ADDRESS, chain
+from brownie import ZERO_ADDRESS, chain
 import utils as utilities
+from utils.tokens import get_token_metadata
 
 def build_data(token, staker_data):
     reward_token_underlying = staker_data['reward_token_underlying'].address
@@ -20,11 +21,12 @@ def build_data(token, staker_data):
     pps = staker_data['strategy_data']['price_per_share_reward_token']
     prices[reward_token] = prices[reward_token_underlying] * pps
 
+    metadata = get_token_metadata(prices)
     price_data = {}
     for item in prices:
         price_data[item] = {}
         price_data[item]['logoURI'] = utilities.utils.get_token_logo_urls(item)
-        price_data[item]['symbol'] = Contract(item).symbol()
+        price_data[item]['symbol'] = metadata[item]['symbol']
         price_data[item]['price'] = prices[item]
         
     return price_data
\ No newline at end of file
@@ -6,9 +6,15 @@ from config import get_json_path
 import json
 import logging
 import os
+import queue
+import threading
 
 CURSOR_FILE = get_json_path("ybs_event_cursor.json")
 CHUNK_SIZE = 150_000
+# Set YBS_INDEXER_PIPELINE=1 to overlap log fetching, enrichment and DB writes
+PIPELINE_ENABLED = os.getenv("YBS_INDEXER_PIPELINE", "0") == "1"
+PIPELINE_QUEUE_SIZE = 4
+_DONE = object()
 
 def main():
     """
@@ -49,33 +55,41 @@ def process_token_events(token, info, height, cursor):
     min_block = min(last_stake, last_unstake, last_claim, last_deposit)
     print(f"{symbol}: Checking events from block {min_block} to {height}")
 
-    # Process Staked events
-    staked_count = 0
-    staked_count += _process_event_in_chunks(
-        ybs.events.Staked, last_stake, height, cursor, ybs_addr, 'Staked',
-        lambda log: handle_stake_event(log, token, info, is_stake=True)
-    )
+    if PIPELINE_ENABLED:
+        counts = _process_events_pipelined([
+            (ybs.events.Staked, last_stake, 'Staked', 'stake', True),
+            (ybs.events.Unstaked, last_unstake, 'Unstaked', 'stake', False),
+            (rewards.events.RewardsClaimed, last_claim, 'RewardsClaimed', 'reward', True),
+            (rewards.events.RewardDeposited, last_deposit, 'RewardDeposited', 'reward', False),
+        ], height, cursor, ybs_addr, token, info)
+        staked_count = counts['Staked']
+        unstaked_count = counts['Unstaked']
+        claimed_count = counts['RewardsClaimed']
+        deposited_count = counts['RewardDeposited']
+    else:
+        # Process Staked events
+        staked_count = _process_event_in_chunks(
+            ybs.events.Staked, last_stake, height, cursor, ybs_addr, 'Staked',
+            lambda log: handle_stake_event(log, token, info, is_stake=True)
+        )
 
-    # Process Unstaked events
-    unstaked_count = 0
-    unstaked_count += _process_event_in_chunks(
-        ybs.events.Unstaked, last_unstake, height, cursor, ybs_addr, 'Unstaked',
-        lambda log: handle_stake_event(log, token, info, is_stake=False)
-    )
+        # Process Unstaked events
+        unstaked_count = _process_event_in_chunks(
+            ybs.events.Unstaked, last_unstake, height, cursor, ybs_addr, 'Unstaked',
+            lambda log: handle_stake_event(log, token, info, is_stake=False)
+        )
 
-    # Process RewardsClaimed events
-    claimed_count = 0
-    claimed_count += _process_event_in_chunks(
-        rewards.events.RewardsClaimed, last_claim, height, cursor, ybs_addr, 'RewardsClaimed',
-        lambda log: handle_reward_event(log, token, info, is_claim=True)
-    )
+        # Process RewardsClaimed events
+        claimed_count = _process_event_in_chunks(
+            rewards.events.RewardsClaimed, last_claim, height, cursor, ybs_addr, 'RewardsClaimed',
+            lambda log: handle_reward_event(log, token, info, is_claim=True)
+        )
 
-    # Process RewardDeposited events
-    deposited_count = 0
-    deposited_count += _process_event_in_chunks(
-        rewards.events.RewardDeposited, last_deposit, height, cursor, ybs_addr, 'RewardDeposited',
-        lambda log: handle_reward_event(log, token, info, is_claim=False)
-    )
+        # Process RewardDeposited events
+        deposited_count = _process_event_in_chunks(
+            rewards.events.RewardDeposited, last_deposit, height, cursor, ybs_addr, 'RewardDeposited',
+            lambda log: handle_reward_event(log, token, info, is_claim=False)
+        )
 
     total = staked_count + unstaked_count + claimed_count + deposited_count
     if total > 0:
@@ -101,6 +115,117 @@ def _process_event_in_chunks(event, start_block, end_block, cursor, ybs_addr, ev
     return count
 
 
+def _process_events_pipelined(jobs, end_block, cursor, ybs_addr, token, info):
+    """
+    Pipelined variant of `_process_event_in_chunks` for all event types of a token.
+
+    A fetch thread pulls log chunks, an enrich thread resolves block timestamps
+    and builds records, and the calling thread writes each chunk in bulk. Stages
+    are joined by bounded queues, so a slow stage throttles the ones before it.
+    The cursor only advances once a chunk has been committed.
+    """
+    log = logging.getLogger(__name__)
+    fetched = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    enriched = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stop = threading.Event()
+    max_weeks = info['ybs'].MAX_STAKE_GROWTH_WEEKS()
+
+    def fetch_stage():
+        for event, start_block, event_type, kind, flag in jobs:
+            current = start_block
+            while current <= end_block:
+                chunk_end = min(current + CHUNK_SIZE - 1, end_block)
+                log.info("%s %s: scanning %s-%s", ybs_addr, event_type, current, chunk_end)
+                logs = event.get_logs(fromBlock=current, toBlock=chunk_end)
+                if not _put(fetched, (event_type, kind, flag, chunk_end, logs), stop):
+                    return
+                current = chunk_end + 1
+
+    def enrich_stage():
+        while True:
+            item = _get(fetched, stop)
+            if item is _DONE or isinstance(item, BaseException):
+                _put(enriched, item, stop)
+                return
+            event_type, kind, flag, chunk_end, logs = item
+            timestamps = {n: chain[n].timestamp for n in {l.blockNumber for l in logs}}
+            if kind == 'stake':
+                records = [
+                    build_stake_record(l, token, info, flag, timestamps[l.blockNumber], max_weeks)
+                    for l in logs
+                ]
+            else:
+                records = [
+                    build_reward_record(l, token, info, flag, timestamps[l.blockNumber])
+                    for l in logs
+                ]
+            if not _put(enriched, (event_type, kind, flag, chunk_end, records), stop):
+                return
+
+    threads = [
+        threading.Thread(target=_run_stage, args=(fetch_stage, fetched, stop), daemon=True),
+        threading.Thread(target=_run_stage, args=(enrich_stage, enriched, stop), daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    counts = {job[2]: 0 for job in jobs}
+    try:
+        while True:
+            item = enriched.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            event_type, kind, flag, chunk_end, records = item
+            if kind == 'stake':
+                # Bucket deltas commit with their stakes rows, before the cursor moves
+                deltas = stake_bucket_deltas(
+                    token, [(flag, record['week'], record['amount']) for record in records], max_weeks
+                )
+                db_utils.insert_stakes(records, token, deltas)
+            else:
+                db_utils.insert_rewards(records)
+            counts[event_type] += len(records)
+            _set_cursor_block(cursor, ybs_addr, event_type, chunk_end + 1)
+            _save_cursor(cursor)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return counts
+
+
+def _run_stage(stage, downstream, stop):
+    """Run a pipeline stage, forwarding completion or failure downstream."""
+    try:
+        stage()
+        _put(downstream, _DONE, stop)
+    except BaseException as e:
+        _put(downstream, e, stop)
+
+
+def _put(q, item, stop):
+    """Blocking put that gives up once the pipeline is stopped."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    """Blocking get that gives up, returning _DONE, once the pipeline is stopped."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
 def _load_cursor():
     if not os.path.exists(CURSOR_FILE):
         return {}
@@ -133,9 +258,15 @@ def _max_start_block(cursor, ybs_addr, event_type, db_block):
 
 def handle_stake_event(log, token, info, is_stake):
     """Process a single Staked or Unstaked event"""
-    decimals = info['decimals']
     block = chain[log.blockNumber]
     max_weeks = info['ybs'].MAX_STAKE_GROWTH_WEEKS()
+    record = build_stake_record(log, token, info, is_stake, block.timestamp, max_weeks)
+    apply_stake_buckets(token, is_stake, record['week'], record['amount'], max_weeks)
+    db_utils.insert_stake(record)
+
+def build_stake_record(log, token, info, is_stake, timestamp, max_weeks):
+    """Build a stakes row from a Staked or Unstaked log"""
+    decimals = info['decimals']
 
     # Handle both Staked (weightAdded) and Unstaked (weightRemoved) events
     weight_change = log['args'].get('weightAdded') or log['args'].get('weightRemoved', 0)
@@ -143,24 +274,7 @@ def handle_stake_event(log, token, info, is_stake):
     week = log['args']['week']
     unlock_week = week + max_weeks if is_stake else None
 
-    if is_stake:
-        db_utils.upsert_stake_bucket(token, unlock_week, amount)
-    else:
-        remaining = amount
-        for target_week in range(week + max_weeks, week, -1):
-            bucket_amount = db_utils.get_stake_bucket_amount(token, target_week)
-            if bucket_amount <= 0:
-                continue
-            if bucket_amount >= remaining:
-                db_utils.upsert_stake_bucket(token, target_week, -remaining)
-                remaining = 0
-                break
-            remaining -= bucket_amount
-            db_utils.upsert_stake_bucket(token, target_week, -bucket_amount)
-        if remaining > 0:
-            print(f"Warning: {token} unstake of {remaining} could not be fully bucketed.")
-
-    record = {
+    return {
         'ybs': log.address,
         'account': log['args']['account'],
         'amount': amount,
@@ -169,33 +283,79 @@ def handle_stake_event(log, token, info, is_stake):
         'unlock_week': unlock_week,
         'new_weight': log['args']['newUserWeight'] / 10 ** decimals,
         'net_weight_change': weight_change / 10 ** decimals,
-        'timestamp': block.timestamp,
-        'date_str': datetime.utcfromtimestamp(block.timestamp).strftime('%Y-%m-%d %H:%M:%S'),
+        'timestamp': timestamp,
+        'date_str': datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S'),
         'txn_hash': log.transactionHash.hex(),
         'block': log.blockNumber,
         'token': token,
     }
-    db_utils.insert_stake(record)
+
+def apply_stake_buckets(token, is_stake, week, amount, max_weeks):
+    """Add a stake to its unlock bucket, or drain an unstake from buckets LIFO"""
+    apply_stake_bucket_changes(token, [(is_stake, week, amount)], max_weeks)
+
+def apply_stake_bucket_changes(token, changes, max_weeks):
+    """Apply (is_stake, week, amount) changes in order against the unlock buckets"""
+    db_utils.upsert_stake_buckets(token, stake_bucket_deltas(token, changes, max_weeks))
+
+def stake_bucket_deltas(token, changes, max_weeks):
+    """
+    Net {unlock_week: delta} from replaying (is_stake, week, amount) changes in
+    order. Buckets are read once up front; nothing is written.
+    """
+    drained_weeks = {
+        target_week
+        for is_stake, week, _ in changes if not is_stake
+        for target_week in range(week + 1, week + max_weeks + 1)
+    }
+    stored = db_utils.get_stake_bucket_amounts(token, drained_weeks)
+    deltas = {}
+
+    def add(target_week, delta):
+        deltas[target_week] = deltas.get(target_week, 0) + delta
+
+    for is_stake, week, amount in changes:
+        if is_stake:
+            add(week + max_weeks, amount)
+            continue
+        remaining = amount
+        for target_week in range(week + max_weeks, week, -1):
+            bucket_amount = stored[target_week] + deltas.get(target_week, 0)
+            if bucket_amount <= 0:
+                continue
+            if bucket_amount >= remaining:
+                add(target_week, -remaining)
+                remaining = 0
+                break
+            remaining -= bucket_amount
+            add(target_week, -bucket_amount)
+        if remaining > 0:
+            print(f"Warning: {token} unstake of {remaining} could not be fully bucketed.")
+
+    return {w: d for w, d in deltas.items() if d != 0}
 
 def handle_reward_event(log, token, info, is_claim):
     """Process a single RewardsClaimed or RewardDeposited event"""
-    decimals = info['decimals']
     block = chain[log.blockNumber]
+    db_utils.insert_reward(build_reward_record(log, token, info, is_claim, block.timestamp))
+
+def build_reward_record(log, token, info, is_claim, timestamp):
+    """Build a rewards row from a RewardsClaimed or RewardDeposited log"""
+    decimals = info['decimals']
 
     # RewardsClaimed has 'account', RewardDeposited has 'depositor'
     account = log['args']['account'] if is_claim else log['args']['depositor']
 
-    record = {
+    return {
         'ybs': info['ybs'].address,
         'reward_distributor': log.address,
         'is_claim': is_claim,
         'account': account,
         'amount': log['args']['rewardAmount'] / 10 ** decimals,
         'week': log['args']['week'],
-        'timestamp': block.timestamp,
-        'date_str': datetime.utcfromtimestamp(block.timestamp).strftime('%Y-%m-%d %H:%M:%S'),
+        'timestamp': timestamp,
+        'date_str': datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S'),
         'txn_hash': log.transactionHash.hex(),
         'block': log.blockNumber,
         'token': token,
     }
-    db_utils.insert_reward(record)
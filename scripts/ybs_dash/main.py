@@ -4,6 +4,7 @@ import json
 from brownie import Contract, chain, network
 from dotenv import load_dotenv
 from utils import utils as utilities
+from utils.tokens import get_decimals, get_symbol
 from config import YBS_REGISTRY, YBS_JSON_FILE, get_json_path
 from scripts.ybs_dash.data_fetchers import (
     peg_data, 
@@ -19,10 +20,21 @@ def main():
     staker_data = populate_staker_info()
     current_time = int(time.time())
     current_height = chain.height
+    # Peg data needs no prices, so build it first and price its peg tokens
+    # in the same up-front batch as everything else
+    for token, data in staker_data.items():
+        data['peg_data'] = peg_data.build_data(token, data, 10_000e18)
+    utilities.register_tokens(
+        address for token, data in staker_data.items()
+        for address in (
+            token,
+            data['reward_token_underlying'].address,
+            data['peg_data']['peg_token'].address,
+        )
+    )
     
     for token, data in staker_data.items():
         data.update({
-            'peg_data': peg_data.build_data(token, data, 10_000e18),
             'strategy_data': strategy_data.build_data(token, data),
             'pipeline_data': processing_pipeline_data.build_data(token, data),
         })
@@ -58,8 +70,8 @@ def populate_staker_info():
         data = {
             'token': Contract(token),
             'ybs': Contract(deployment['yearnBoostedStaker']),
-            'decimals': Contract(token).decimals(),
-            'symbol': Contract(token).symbol(),
+            'decimals': get_decimals(token),
+            'symbol': get_symbol(token),
             'rewards': Contract(deployment['rewardDistributor']),
             'utils': Contract(deployment['utilities']),
             'ybs_deploy_block': utilities.contract_creation_block(deployment['yearnBoostedStaker']),
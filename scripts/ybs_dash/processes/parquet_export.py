@@ -0,0 +1,118 @@
+from utils import db as db_utils
+from config import get_json_path
+from sqlalchemy import Numeric, select
+from datetime import datetime
+import pandas as pd
+import json, os
+
+EXPORT_DIR = get_json_path('parquet')
+CURSOR_FILE = os.path.join(EXPORT_DIR, '_cursor.json')
+# Legacy JSON column, superseded by the stake_map_entries table
+SKIP_COLUMNS = ['stake_map']
+
+def main():
+    """
+    Incrementally export stakes, rewards, week_info and user_info to Parquet,
+    partitioned by token and month: EXPORT_DIR/<table>/token=<token>/month=<YYYY-MM>/
+    """
+    cursor = _load_cursor()
+    # The cursor is saved after every table so a later failure can't make a
+    # rerun export rows that were already written
+    export_events('stakes', db_utils.Stakes, cursor)
+    _save_cursor(cursor)
+    export_events('rewards', db_utils.Rewards, cursor)
+    _save_cursor(cursor)
+    week_start = _week_start_map()
+    export_weeks('week_info', db_utils.WeekInfo, cursor, week_start)
+    _save_cursor(cursor)
+    export_weeks('user_info', db_utils.UserInfo, cursor, week_start)
+    _save_cursor(cursor)
+
+def export_events(table, model, cursor):
+    """
+    Append rows past each token's last exported block as new part files. Tokens
+    are indexed independently, so each keeps its own block cursor.
+    """
+    tokens = _tokens(model)
+    last_blocks = cursor.get(table, {})
+    exported = 0
+    for token in tokens:
+        last_block = last_blocks.get(token, 0)
+        df = _read(model, select(model).where(model.token == token, model.block > last_block).order_by(model.block))
+        if df.empty:
+            continue
+        df['month'] = df['timestamp'].apply(_month)
+        for month, part in df.groupby('month'):
+            name = f'part-{part["block"].min()}-{part["block"].max()}.parquet'
+            _write(part, table, token, month, name)
+        last_blocks[token] = int(df['block'].max())
+        exported += len(df)
+    cursor[table] = last_blocks
+    print(f'{table}: exported {exported} rows across {len(tokens)} tokens')
+
+def export_weeks(table, model, cursor, week_start):
+    """
+    Week-keyed tables are upserted while a week is live, so every week after the
+    last finalized one is rewritten as a single file per (token, week).
+    """
+    last_final_week = cursor.get(table, -1)
+    df = _read(model, select(model).where(model.week_id > last_final_week))
+    if df.empty:
+        print(f'{table}: nothing to export past week {last_final_week}')
+        return
+    df['month'] = [_month(week_start.get((y, w), 0)) for y, w in zip(df['ybs'], df['week_id'])]
+    for (token, week_id, month), part in df.groupby(['token', 'week_id', 'month']):
+        _write(part, table, token, month, f'week-{week_id}.parquet')
+    # The newest week per token may still change; keep it in the export window
+    cursor[table] = int(df.groupby('token')['week_id'].max().min()) - 1
+    print(f'{table}: exported {len(df)} rows, finalized through week {cursor[table]}')
+
+def _tokens(model):
+    with db_utils.engine.connect() as connection:
+        return [token for (token,) in connection.execute(select(model.token).distinct())]
+
+def _week_start_map():
+    """(ybs, week_id) -> start_ts, used to place week-keyed rows in month partitions."""
+    query = select(db_utils.WeekInfo.ybs, db_utils.WeekInfo.week_id, db_utils.WeekInfo.start_ts)
+    with db_utils.engine.connect() as connection:
+        return {(ybs, week_id): start_ts for ybs, week_id, start_ts in connection.execute(query)}
+
+def _read(model, query):
+    df = pd.read_sql(query, db_utils.engine)
+    df = df.drop(columns=[c for c in SKIP_COLUMNS if c in df.columns])
+    # Numeric(30, 18) columns come back as Decimal objects
+    for column in model.__table__.columns:
+        if isinstance(column.type, Numeric) and column.name in df.columns:
+            df[column.name] = df[column.name].astype(float)
+    return df
+
+def _write(part, table, token, month, name):
+    # token and month are encoded in the partition path
+    path = os.path.join(EXPORT_DIR, table, f'token={token}', f'month={month}')
+    os.makedirs(path, exist_ok=True)
+    part.drop(columns=['token', 'month']).to_parquet(
+        os.path.join(path, name), index=False, compression='zstd'
+    )
+
+def _month(ts):
+    ts = 0 if pd.isna(ts) else int(ts)
+    return datetime.utcfromtimestamp(ts).strftime('%Y-%m')
+
+def _load_cursor():
+    if not os.path.exists(CURSOR_FILE):
+        return {}
+    try:
+        with open(CURSOR_FILE, 'r') as handle:
+            return json.load(handle)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def _save_cursor(cursor):
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    tmp_path = CURSOR_FILE + '.tmp'
+    with open(tmp_path, 'w') as handle:
+        json.dump(cursor, handle, indent=2, sort_keys=True)
+    os.replace(tmp_path, CURSOR_FILE)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
-from brownie import Contract, chain
+from brownie import Contract, chain, multicall
 from utils import utils as utilities
 from utils import db as db_utils
+from utils.rpc import multicall_value
 import json, os
 from dotenv import load_dotenv
 from scripts.ybs_dash.main import populate_staker_info
@@ -9,9 +10,12 @@ from datetime import datetime
 load_dotenv()
 staker_info = {}
 height = chain.height
+# Calls per multicall; brownie sends each `with multicall()` block as one request
+MULTICALL_BATCH = 500
 
 def main():
     global staker_info
+    db_utils.ensure_stake_map_schema()
     staker_info = populate_staker_info()
 
     for token, info in staker_info.items():
@@ -70,38 +74,95 @@ def insert_week_info(
         'end_block': end_block,
         'start_time_str': datetime.fromtimestamp(start_ts).strftime("%Y-%m-%d"),
         'end_time_str': datetime.fromtimestamp(end_ts).strftime("%Y-%m-%d"),
-        'stake_map': stake_map
     }, do_upsert)
+    db_utils.insert_stake_map_entries(
+        db_utils.stake_map_to_entries(ybs.address, db_utils.GLOBAL_ACCOUNT, week, stake_map),
+        do_upsert,
+    )
     print(f'Week {week} successfully written.')
 
 def insert_users_info(users, info, week, end_block, max_weeks, decimals, do_upsert=False):
+    """
+    Batched user fill for a single week. All per-user reads are multicalled,
+    stake maps are built from the batched results and every row is written
+    with a single bulk upsert.
+    """
     ybs = info['ybs']
     token = info['token']
     rewards = info['rewards']
     reward_decimals = Contract(info['rewards'].rewardToken()).decimals()
-    for user in users:
-        weight = ybs.getAccountWeightAt(user, week) / 1e18
-        if weight == 0:
+    users = list(users)
+    if len(users) == 0:
+        return
+
+    # Week-indexed reads are resolved at head, same as the unbatched calls did
+    weights = batched_multicall(users, lambda user: ybs.getAccountWeightAt(user, week))
+    claimable = batched_multicall(users, lambda user: rewards.getClaimableAt(user, week))
+    active_users = [user for user in users if weights[user] is not None and weights[user] != 0]
+    if len(active_users) == 0:
+        return
+
+    balances = batched_multicall(active_users, lambda user: ybs.balanceOf(user), end_block)
+    acct_datas = batched_multicall(active_users, lambda user: ybs.accountData(user), end_block)
+    active_users = [user for user in active_users if acct_datas[user] is not None]
+
+    targets = {
+        user: stake_map_target_weeks(acct_datas[user], week, max_weeks)
+        for user in active_users
+    }
+    to_realize = batched_multicall(
+        [(user, target_week) for user in active_users for target_week in targets[user]],
+        lambda key: ybs.accountWeeklyToRealize(*key),
+        end_block,
+    )
+
+    records = []
+    stake_map_rows = []
+    for user in active_users:
+        reads = [claimable[user], balances[user]] + [to_realize[(user, t)] for t in targets[user]]
+        if any(value is None for value in reads):
+            print(f'Skipping {user} @ week {week}: multicall read failed.')
             continue
-        balance = ybs.balanceOf(user, block_identifier=end_block) / 1e18
-        acct_data = ybs.accountData(user, block_identifier=end_block)    
-        stake_map = build_user_stake_map(
-            ybs, user, acct_data, week, end_block, max_weeks, decimals
+        weight = weights[user] / 1e18
+        balance = balances[user] / 1e18
+        stake_map = assemble_user_stake_map(
+            ybs,
+            acct_datas[user],
+            week,
+            targets[user],
+            {t: to_realize[(user, t)]['weight'] for t in targets[user]},
+            max_weeks,
+            decimals,
         )
-
-        db_utils.insert_user_info({
+        records.append({
             'account': user,
             'week_id': week,
             'token': token.address,
             'weight': weight,
             'balance': balance,
             'boost': weight / balance,
-            'stake_map': stake_map,
-            'rewards_earned': rewards.getClaimableAt(user, week) / 10 ** reward_decimals,
+            'rewards_earned': claimable[user] / 10 ** reward_decimals,
             'ybs': ybs.address,
             'total_realized': stake_map['realized'],
-        }, do_upsert)
-        print(f'User {user} @ week {week} successfully written.')
+        })
+        stake_map_rows += db_utils.stake_map_to_entries(ybs.address, user, week, stake_map)
+
+    db_utils.insert_users_info(records, do_upsert)
+    db_utils.insert_stake_map_entries(stake_map_rows, do_upsert)
+    print(f'{len(records)} users @ week {week} successfully written.')
+
+
+def batched_multicall(keys, read, block=None):
+    """
+    {key: read(key)} with the reads multicalled MULTICALL_BATCH at a time.
+    Failed calls map to None.
+    """
+    results = {}
+    for i in range(0, len(keys), MULTICALL_BATCH):
+        with multicall(block_identifier=block):
+            batch = {key: read(key) for key in keys[i:i + MULTICALL_BATCH]}
+        results.update({key: multicall_value(value) for key, value in batch.items()})
+    return results
 
 
 def update_current_week(token, info):
@@ -173,25 +234,44 @@ def build_user_stake_map(ybs, user, acct_data, week, block, max_weeks, decimals)
     """
     Returns a dict where keys are the deposit week and 
     """
+    target_weeks = stake_map_target_weeks(acct_data, week, max_weeks)
+    weekly_weights = {
+        target_week: ybs.accountWeeklyToRealize(
+            user, target_week, block_identifier=block
+        )['weight']
+        for target_week in target_weeks
+    }
+    return assemble_user_stake_map(
+        ybs, acct_data, week, target_weeks, weekly_weights, max_weeks, decimals
+    )
+
+def stake_map_target_weeks(acct_data, week, max_weeks):
+    """
+    Target weeks encoded in an account's update bitmap, in bitmap order.
+    """
     week_offset = week - acct_data['lastUpdateWeek']
     bitmap = acct_data['updateWeeksBitmap']
     bitstring = format(bitmap, '08b')[::-1][:-(max_weeks-1)]    # Reverse order and trim
     bitarray = [int(char) for char in bitstring]            # Convert to array
     # bitarray = shift_array(bitarray, week_offset) # Adjust for offset
+    return [
+        week - week_offset + (len(bitarray) - 1 - i)
+        for i in range(len(bitarray))
+    ]
+
+def assemble_user_stake_map(ybs, acct_data, week, target_weeks, weekly_weights, max_weeks, decimals):
+    """
+    Build a user stake map from already-fetched `accountWeeklyToRealize` weights.
+    """
     realized = acct_data['realizedStake'] * 2 / 10 ** decimals
     pending_map = {}
 
-    for i, bit in enumerate(bitarray):
-        target_week = week - week_offset + (len(bitarray) - 1 - i)
+    for target_week in target_weeks:
         amt = 0
         if target_week < week:
-            realized += ybs.accountWeeklyToRealize(
-                user, target_week, block_identifier=block
-            )['weight'] * 2 / 10 ** decimals
+            realized += weekly_weights[target_week] * 2 / 10 ** decimals
         else:
-            amt = ybs.accountWeeklyToRealize(
-                user, target_week, block_identifier=block
-            )['weight'] * 2 / 10 ** decimals
+            amt = weekly_weights[target_week] * 2 / 10 ** decimals
         pending_map[target_week] = {
             'amount': amt,
             'week_start_ts': utilities.get_week_start_ts(ybs.address, target_week),
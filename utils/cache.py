@@ -1,6 +1,21 @@
 import os
+import time
+import pickle
+import hashlib
+import inspect
+import functools
+import threading
+from collections import OrderedDict
 from brownie import chain, network
-from joblib import Memory
+
+# Entry kinds
+IMMUTABLE = 'immutable'     # finalized chain data; kept on disk until evicted
+HEAD = 'head'               # depends on chain head; expires after a TTL
+RUN = 'run'                 # in-process only, dropped when the process exits
+
+DEFAULT_HEAD_TTL = 60 * 60
+DEFAULT_MAX_BYTES = int(os.getenv("YBS_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+DEFAULT_MEMORY_ENTRIES = 10_000
 
 def _resolve_cache_dir():
     override = os.getenv("YBS_CACHE_DIR")
@@ -13,4 +28,152 @@ def _resolve_cache_dir():
         return f"cache/{chain_id}"
     return "cache/unknown"
 
-memory = Memory(_resolve_cache_dir(), verbose=0)
+
+class Memory:
+    """
+    Two-tier function cache: an in-process LRU dict in front of a size-bounded
+    pickle store on disk. Drop-in for the `memory.cache()` decorator usage of
+    joblib, with an entry `kind` (IMMUTABLE, HEAD or RUN) and optional `ttl`.
+    """
+
+    def __init__(self, location, max_bytes=DEFAULT_MAX_BYTES, memory_entries=DEFAULT_MEMORY_ENTRIES):
+        self.location = location
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._hot = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._disk_bytes = None
+
+    def cache(self, kind=IMMUTABLE, ttl=None):
+        if kind == HEAD and ttl is None:
+            ttl = DEFAULT_HEAD_TTL
+
+        def decorator(func):
+            namespace = f"{func.__module__}.{func.__qualname__}"
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                key = self._key(namespace, bound.arguments)
+                hit, value = self._get(namespace, key, kind)
+                if hit:
+                    return value
+                value = func(*args, **kwargs)
+                expires_at = None if ttl is None else time.time() + ttl
+                self._set(namespace, key, value, kind, expires_at)
+                return value
+
+            return wrapper
+        return decorator
+
+    def clear(self):
+        with self._lock:
+            self._hot.clear()
+        if os.path.isdir(self.location):
+            for path, _ in self._disk_entries():
+                os.remove(path)
+        self._disk_bytes = 0
+
+    @staticmethod
+    def _key(namespace, arguments):
+        raw = repr((namespace, sorted(arguments.items()))).encode()
+        return hashlib.sha1(raw).hexdigest()
+
+    def _path(self, namespace, key):
+        return os.path.join(self.location, namespace, f"{key}.pkl")
+
+    def _get(self, namespace, key, kind):
+        now = time.time()
+        with self._lock:
+            entry = self._hot.get(key)
+            if entry is not None:
+                if entry[0] is None or entry[0] > now:
+                    self._hot.move_to_end(key)
+                    return True, entry[1]
+                del self._hot[key]
+        if kind == RUN:
+            return False, None
+
+        path = self._path(namespace, key)
+        try:
+            with open(path, 'rb') as handle:
+                expires_at, value = pickle.load(handle)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False, None
+        if expires_at is not None and expires_at <= now:
+            self._remove(path)
+            return False, None
+        os.utime(path)  # mtime doubles as LRU recency for eviction
+        self._remember(key, expires_at, value)
+        return True, value
+
+    def _set(self, namespace, key, value, kind, expires_at):
+        self._remember(key, expires_at, value)
+        if kind == RUN:
+            return
+        path = self._path(namespace, key)
+        try:
+            data = pickle.dumps((expires_at, value), protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as handle:
+            handle.write(data)
+        os.replace(tmp_path, path)
+        self._track(len(data))
+
+    def _remember(self, key, expires_at, value):
+        with self._lock:
+            self._hot[key] = (expires_at, value)
+            self._hot.move_to_end(key)
+            while len(self._hot) > self.memory_entries:
+                self._hot.popitem(last=False)
+
+    def _track(self, size):
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(size for _, size in self._disk_entries())
+        else:
+            self._disk_bytes += size
+        if self._disk_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used files until the store is at 90% of budget."""
+        entries = []
+        for path, size in self._disk_entries():
+            try:
+                entries.append((os.path.getmtime(path), path, size))
+            except OSError:
+                continue
+        entries.sort()
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for _, path, size in entries:
+            if total <= target:
+                break
+            self._remove(path)
+            total -= size
+        self._disk_bytes = total
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.location):
+            for name in files:
+                if not name.endswith('.pkl'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    yield path, os.path.getsize(path)
+                except OSError:
+                    continue
+
+
+memory = Memory(_resolve_cache_dir())
@@ -1,14 +1,34 @@
-from sqlalchemy import create_engine, MetaData, Table, Column, String, Integer, Boolean, Numeric, JSON, UniqueConstraint, select, text
+from sqlalchemy import create_engine, MetaData, Table, Column, String, Integer, Boolean, Numeric, JSON, UniqueConstraint, Index, func, inspect, select, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.dialects.postgresql import insert
 
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
+
+# Local mode is opt-in: set DATABASE_URI=sqlite:///... directly, or
+# YBS_DB_BACKEND=sqlite to use an embedded SQLite file at YBS_LOCAL_DB.
+LOCAL_DATABASE_PATH = os.getenv('YBS_LOCAL_DB', './data/ybs.sqlite')
+DATABASE_URI = os.getenv('DATABASE_URI')
+if not DATABASE_URI and os.getenv('YBS_DB_BACKEND') == 'sqlite':
+    os.makedirs(os.path.dirname(LOCAL_DATABASE_PATH) or '.', exist_ok=True)
+    DATABASE_URI = f'sqlite:///{LOCAL_DATABASE_PATH}'
+    print(f'Using embedded SQLite at {LOCAL_DATABASE_PATH}')
+if not DATABASE_URI:
+    raise RuntimeError('DATABASE_URI is not set (set YBS_DB_BACKEND=sqlite for a local SQLite database)')
+
 # Create an engine
-engine = create_engine(os.getenv('DATABASE_URI'))  # Adjust the URL to your database
+engine = create_engine(DATABASE_URI)  # Adjust the URL to your database
+
+# Both dialects expose the same on_conflict_do_update/on_conflict_do_nothing API
+if engine.dialect.name == 'sqlite':
+    from sqlalchemy.dialects.sqlite import insert
+else:
+    from sqlalchemy.dialects.postgresql import insert
+
+# Rows per multi-VALUES statement; keeps SQLite under its bound-parameter limit
+BULK_CHUNK_SIZE = 500
 
 # Define the base class
 Base = declarative_base()
@@ -55,7 +75,7 @@ class WeekInfo(Base):
 
 class UserInfo(Base):
     __tablename__ = 'user_info'
-    account = Column(String)
+    account = Column(String, primary_key=True)
     week_id = Column(Integer, primary_key=True)
     token = Column(String)
     weight = Column(Numeric(30, 18))
@@ -92,6 +112,25 @@ class StakeBuckets(Base):
     unlock_week = Column(Integer, primary_key=True)
     net_amount = Column(Numeric(30, 18))
 
+# Normalized per-week stake maps. One row per (ybs, account, week_id, target_week);
+# global week maps use GLOBAL_ACCOUNT and the realized total uses REALIZED_TARGET_WEEK.
+class StakeMapEntries(Base):
+    __tablename__ = 'stake_map_entries'
+
+    ybs = Column(String, primary_key=True)
+    account = Column(String, primary_key=True)
+    week_id = Column(Integer, primary_key=True)
+    target_week = Column(Integer, primary_key=True)
+    amount = Column(Numeric(30, 18))
+    week_start_ts = Column(Integer)
+    max_weeks = Column(Integer)
+    __table_args__ = (
+        Index('stake_map_entries_ybs_week_target_idx', 'ybs', 'week_id', 'target_week'),
+    )
+
+GLOBAL_ACCOUNT = '0x0000000000000000000000000000000000000000'
+REALIZED_TARGET_WEEK = -1
+
 # Bind the engine to the metadata of the Base class
 Base.metadata.create_all(engine)
 
@@ -109,6 +148,10 @@ stakes = Table('stakes', metadata,
 
 
 
+def _chunks(rows, size=BULK_CHUNK_SIZE):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
 def query_unique_accounts(token):
     with engine.connect() as connection:
         query = select(stakes.c.account.distinct()).where(stakes.c.token == token)
@@ -173,6 +216,32 @@ def insert_user_info(record, do_upsert=False):
         # Close the session
         session.close()
 
+def insert_users_info(records, do_upsert=False):
+    """Bulk insert/upsert user_info rows; without upsert existing rows are skipped"""
+    if not records:
+        return
+    session = Session()
+
+    try:
+        for chunk in _chunks(records):
+            stmt = insert(UserInfo).values(chunk)
+            if do_upsert:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['account', 'week_id', 'ybs'],
+                    set_={key: getattr(stmt.excluded, key) for key in records[0].keys()}
+                )
+            else:
+                # Rows already written for this week are left as they are
+                stmt = stmt.on_conflict_do_nothing(index_elements=['account', 'week_id', 'ybs'])
+            session.execute(stmt)
+        session.commit()
+        print(f"{len(records)} user_info records inserted successfully!")
+    except Exception as e:
+        session.rollback()
+        print(f"Error inserting user_info records: {e}")
+    finally:
+        session.close()
+
 def get_latest_stake_recorded_for_token(token):
     session = Session()
     # Query to find the highest week_id for the given token
@@ -230,6 +299,43 @@ def insert_reward(record):
     finally:
         session.close()
 
+def insert_stakes(records, token=None, bucket_deltas=None):
+    """
+    Bulk insert stake/unstake event records in one transaction, together with
+    the token's {unlock_week: delta_amount} stake bucket changes if given
+    """
+    if not records:
+        return
+    session = Session()
+    try:
+        for chunk in _chunks(records):
+            session.execute(insert(Stakes).values(chunk).on_conflict_do_nothing())
+        if bucket_deltas:
+            session.execute(_stake_buckets_upsert(token, bucket_deltas))
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"Error inserting stakes: {e}")
+        raise
+    finally:
+        session.close()
+
+def insert_rewards(records):
+    """Bulk insert reward claim/deposit event records in one transaction"""
+    if not records:
+        return
+    session = Session()
+    try:
+        for chunk in _chunks(records):
+            session.execute(insert(Rewards).values(chunk).on_conflict_do_nothing())
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"Error inserting rewards: {e}")
+        raise
+    finally:
+        session.close()
+
 def get_last_block_for_event(ybs, event_type):
     """Get the last block written for a specific event type to enable resumption"""
     session = Session()
@@ -254,8 +360,11 @@ def get_last_block_for_event(ybs, event_type):
         session.close()
 
 def ensure_ybs_schema():
-    with engine.begin() as connection:
-        connection.execute(text("ALTER TABLE stakes ADD COLUMN IF NOT EXISTS unlock_week INTEGER"))
+    # SQLite has no ADD COLUMN IF NOT EXISTS, so check the live schema instead
+    columns = [c['name'] for c in inspect(engine).get_columns('stakes')]
+    if 'unlock_week' not in columns:
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE stakes ADD COLUMN unlock_week INTEGER"))
     StakeBuckets.__table__.create(engine, checkfirst=True)
 
 def upsert_stake_bucket(token, unlock_week, delta_amount):
@@ -290,6 +399,48 @@ def get_stake_bucket_amount(token, unlock_week):
     finally:
         session.close()
 
+def get_stake_bucket_amounts(token, unlock_weeks):
+    """{unlock_week: net_amount} for the given weeks; missing buckets read as 0.0"""
+    unlock_weeks = list(unlock_weeks)
+    if not unlock_weeks:
+        return {}
+    session = Session()
+    try:
+        rows = session.query(StakeBuckets.unlock_week, StakeBuckets.net_amount)\
+            .filter(StakeBuckets.token == token)\
+            .filter(StakeBuckets.unlock_week.in_(unlock_weeks))\
+            .all()
+        amounts = {week: 0.0 for week in unlock_weeks}
+        amounts.update({week: float(amount) for week, amount in rows})
+        return amounts
+    finally:
+        session.close()
+
+def upsert_stake_buckets(token, deltas):
+    """Add {unlock_week: delta_amount} to the token's buckets in a single statement"""
+    if not deltas:
+        return
+    session = Session()
+    try:
+        session.execute(_stake_buckets_upsert(token, deltas))
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"Error upserting stake buckets: {e}")
+        raise
+    finally:
+        session.close()
+
+def _stake_buckets_upsert(token, deltas):
+    stmt = insert(StakeBuckets).values([
+        {'token': token, 'unlock_week': week, 'net_amount': delta}
+        for week, delta in deltas.items()
+    ])
+    return stmt.on_conflict_do_update(
+        index_elements=['token', 'unlock_week'],
+        set_={'net_amount': StakeBuckets.net_amount + stmt.excluded.net_amount},
+    )
+
 def clear_stake_buckets(token):
     session = Session()
     try:
@@ -317,3 +468,146 @@ def backfill_unlock_week(token, max_weeks):
         print(f"Error backfilling unlock_week: {e}")
     finally:
         session.close()
+
+
+def ensure_stake_map_schema():
+    """Create stake_map_entries and the `stake_map_json` compatibility view"""
+    StakeMapEntries.__table__.create(engine, checkfirst=True)
+    with engine.begin() as connection:
+        if engine.dialect.name == 'sqlite':
+            connection.execute(text("DROP VIEW IF EXISTS stake_map_json"))
+            connection.execute(text(f"""
+                CREATE VIEW stake_map_json AS
+                SELECT
+                    ybs, account, week_id,
+                    json_group_object(
+                        CASE WHEN target_week = {REALIZED_TARGET_WEEK} THEN 'realized' ELSE CAST(target_week AS TEXT) END,
+                        CASE WHEN target_week = {REALIZED_TARGET_WEEK} THEN amount
+                        ELSE json_object('amount', amount, 'week_start_ts', week_start_ts, 'max_weeks', max_weeks)
+                        END
+                    ) AS stake_map
+                FROM stake_map_entries
+                GROUP BY ybs, account, week_id
+            """))
+            return
+        connection.execute(text(f"""
+            CREATE OR REPLACE VIEW stake_map_json AS
+            SELECT
+                ybs, account, week_id,
+                jsonb_object_agg(
+                    CASE WHEN target_week = {REALIZED_TARGET_WEEK} THEN 'realized' ELSE target_week::text END,
+                    CASE WHEN target_week = {REALIZED_TARGET_WEEK} THEN to_jsonb(amount)
+                    ELSE jsonb_build_object('amount', amount, 'week_start_ts', week_start_ts, 'max_weeks', max_weeks)
+                    END
+                ) AS stake_map
+            FROM stake_map_entries
+            GROUP BY ybs, account, week_id
+        """))
+
+def stake_map_to_entries(ybs, account, week_id, stake_map):
+    """Flatten a stake map dict into stake_map_entries rows"""
+    rows = []
+    for target_week, value in stake_map.items():
+        if target_week == 'realized':
+            rows.append({
+                'ybs': ybs,
+                'account': account,
+                'week_id': week_id,
+                'target_week': REALIZED_TARGET_WEEK,
+                'amount': value,
+                'week_start_ts': None,
+                'max_weeks': None,
+            })
+            continue
+        rows.append({
+            'ybs': ybs,
+            'account': account,
+            'week_id': week_id,
+            'target_week': int(target_week),
+            'amount': value['amount'],
+            'week_start_ts': value['week_start_ts'],
+            'max_weeks': value['max_weeks'],
+        })
+    return rows
+
+def insert_stake_map_entries(rows, do_upsert=False):
+    """Bulk insert/upsert stake_map_entries rows; without upsert existing rows are skipped"""
+    if not rows:
+        return
+    session = Session()
+    try:
+        for chunk in _chunks(rows):
+            stmt = insert(StakeMapEntries).values(chunk)
+            if do_upsert:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['ybs', 'account', 'week_id', 'target_week'],
+                    set_={
+                        'amount': stmt.excluded.amount,
+                        'week_start_ts': stmt.excluded.week_start_ts,
+                        'max_weeks': stmt.excluded.max_weeks,
+                    }
+                )
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=['ybs', 'account', 'week_id', 'target_week'])
+            session.execute(stmt)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"Error inserting stake map entries: {e}")
+    finally:
+        session.close()
+
+def get_stake_map(ybs, account, week_id):
+    """Rebuild the legacy stake map dict for one account (or GLOBAL_ACCOUNT) and week"""
+    session = Session()
+    try:
+        rows = session.query(StakeMapEntries)\
+            .filter(StakeMapEntries.ybs == ybs)\
+            .filter(StakeMapEntries.account == account)\
+            .filter(StakeMapEntries.week_id == week_id)\
+            .order_by(StakeMapEntries.target_week)\
+            .all()
+        stake_map = {}
+        for row in rows:
+            if row.target_week == REALIZED_TARGET_WEEK:
+                stake_map['realized'] = float(row.amount)
+                continue
+            stake_map[row.target_week] = {
+                'amount': float(row.amount),
+                'week_start_ts': row.week_start_ts,
+                'max_weeks': row.max_weeks,
+            }
+        return stake_map
+    finally:
+        session.close()
+
+def get_total_unlocking(ybs, week_id, target_week):
+    """Sum of user amounts pending for `target_week` as of the `week_id` snapshot"""
+    session = Session()
+    try:
+        result = session.query(func.sum(StakeMapEntries.amount))\
+            .filter(StakeMapEntries.ybs == ybs)\
+            .filter(StakeMapEntries.week_id == week_id)\
+            .filter(StakeMapEntries.target_week == target_week)\
+            .filter(StakeMapEntries.account != GLOBAL_ACCOUNT)\
+            .scalar()
+        return float(result) if result else 0.0
+    finally:
+        session.close()
+
+def analytics_connection():
+    """
+    DuckDB connection with the active database attached as `ybs`, for analytic
+    queries over stakes/rewards (e.g. `SELECT ... FROM ybs.stakes`).
+    Requires DuckDB's sqlite/postgres scanner extension for the backend in use.
+    """
+    import duckdb
+    con = duckdb.connect(database=':memory:')
+    if engine.dialect.name == 'sqlite':
+        con.execute("INSTALL sqlite; LOAD sqlite;")
+        con.execute(f"ATTACH '{engine.url.database}' AS ybs (TYPE sqlite, READ_ONLY)")
+    else:
+        url = engine.url.set(drivername='postgresql').render_as_string(hide_password=False)
+        con.execute("INSTALL postgres; LOAD postgres;")
+        con.execute(f"ATTACH '{url}' AS ybs (TYPE postgres, READ_ONLY)")
+    return con
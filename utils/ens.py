@@ -0,0 +1,106 @@
+import os
+import json
+from brownie import Contract, ZERO_ADDRESS, multicall
+from ens import ENS
+from utils.rpc import multicall_value
+
+# ENS name service backed by a JSON cache (address -> name, '' when unnamed).
+# The cache is read once per process; unknown addresses are reverse resolved in
+# bulk with multicall and only kept when the name forward-resolves back to them.
+
+ENS_REGISTRY = '0x00000000000C2E074eC69A0dFb2997BA6C7d2e1e'
+CACHE_FILE = 'ens_cache.json'
+BATCH_SIZE = 500
+
+REGISTRY_ABI = [{
+    'name': 'resolver', 'type': 'function', 'stateMutability': 'view',
+    'inputs': [{'name': 'node', 'type': 'bytes32'}],
+    'outputs': [{'name': '', 'type': 'address'}],
+}]
+RESOLVER_ABI = [
+    {
+        'name': 'name', 'type': 'function', 'stateMutability': 'view',
+        'inputs': [{'name': 'node', 'type': 'bytes32'}],
+        'outputs': [{'name': '', 'type': 'string'}],
+    },
+    {
+        'name': 'addr', 'type': 'function', 'stateMutability': 'view',
+        'inputs': [{'name': 'node', 'type': 'bytes32'}],
+        'outputs': [{'name': '', 'type': 'address'}],
+    },
+]
+
+_NAMES = {}     # cache file path -> {address: name}
+
+def load(cache_file=CACHE_FILE):
+    """Address -> name map for cache_file, parsed from disk once per process."""
+    if cache_file not in _NAMES:
+        try:
+            with open(cache_file, 'r') as file:
+                _NAMES[cache_file] = json.load(file) or {}
+        except (OSError, json.JSONDecodeError):
+            _NAMES[cache_file] = {}
+    return _NAMES[cache_file]
+
+def get_name(address, cache_file=CACHE_FILE):
+    return load(cache_file).get(address) or ''
+
+def resolve(addresses, cache_file=CACHE_FILE):
+    """
+    Resolve every address not yet in the cache, persist the additions and
+    return {address: name} for all requested addresses.
+    """
+    names = load(cache_file)
+    unknown = sorted({a for a in addresses if a != ZERO_ADDRESS and a not in names})
+    if unknown:
+        for i in range(0, len(unknown), BATCH_SIZE):
+            names.update(reverse_resolve(unknown[i:i + BATCH_SIZE]))
+        save(cache_file)
+    return {a: names.get(a) or '' for a in addresses}
+
+def reverse_resolve(addresses):
+    """Reverse resolve a batch of addresses with forward verification."""
+    registry = Contract.from_abi('ENSRegistry', ENS_REGISTRY, REGISTRY_ABI)
+    nodes = {a: ENS.namehash(f'{a.lower()[2:]}.addr.reverse') for a in addresses}
+
+    with multicall():
+        resolvers = {a: registry.resolver(nodes[a]) for a in addresses}
+    resolvers = {a: str(r) for a, r in _values(resolvers).items() if r and r != ZERO_ADDRESS}
+
+    with multicall():
+        claimed = {a: _resolver(r).name(nodes[a]) for a, r in resolvers.items()}
+    claimed = {a: str(n) for a, n in _values(claimed).items() if n}
+
+    # A reverse record is only trusted if the name points back at the address
+    forward_nodes = {a: ENS.namehash(n) for a, n in claimed.items()}
+    with multicall():
+        forward_resolvers = {a: registry.resolver(forward_nodes[a]) for a in claimed}
+    forward_resolvers = {a: str(r) for a, r in _values(forward_resolvers).items() if r and r != ZERO_ADDRESS}
+    with multicall():
+        forward = {a: _resolver(r).addr(forward_nodes[a]) for a, r in forward_resolvers.items()}
+    forward = _values(forward)
+
+    results = {}
+    for a in addresses:
+        verified = forward.get(a) and str(forward[a]).lower() == a.lower()
+        results[a] = claimed[a] if verified else ''
+        if results[a]:
+            print(a, results[a])
+    return results
+
+def save(cache_file=CACHE_FILE):
+    names = load(cache_file)
+    directory = os.path.dirname(cache_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{cache_file}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(names, file, indent=4)
+    os.replace(tmp_path, cache_file)
+
+def _values(results):
+    """Unwrap a dict of multicall results; failed calls become None."""
+    return {a: multicall_value(r) for a, r in results.items()}
+
+def _resolver(address):
+    return Contract.from_abi('ENSResolver', address, RESOLVER_ABI)
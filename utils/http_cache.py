@@ -0,0 +1,186 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import requests
+from utils.cache import _resolve_cache_dir
+
+try:
+    import orjson as _fast_json
+except ImportError:
+    _fast_json = None
+
+# Shared cache for external JSON documents. Bodies are stored gzip-compressed on
+# disk next to their ETag/Last-Modified validators. Within `ttl` a document is
+# served from the cache; after that it is revalidated with a conditional GET, so
+# unchanged documents cost a 304. Parsed objects are also kept for the process.
+
+DEFAULT_TTL = 60 * 60
+DEFAULT_TIMEOUT = 10
+MAX_BYTES = int(os.getenv("YBS_HTTP_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+MAX_RETRIES = 3
+BASE_DELAY = 2
+
+_PARSED = {}    # key -> (etag, last_modified, object)
+
+def get_json(url, params=None, ttl=DEFAULT_TTL, timeout=DEFAULT_TIMEOUT, transform=None, max_stale=None):
+    """
+    Fetch a JSON document through the cache and return the parsed object.
+
+    transform: applied to freshly downloaded documents before they are stored,
+        so callers can persist a compact derived form (e.g. an address index).
+    max_stale: how old (seconds) a cached copy may be when the source can't be
+        reached; None serves any cached copy. Raises if nothing usable is cached.
+    """
+    key = _key(url, params)
+    meta = _load_meta(key)
+    now = time.time()
+
+    if meta and now - meta['fetched_at'] < ttl:
+        cached = _load_body(key, meta)
+        if cached is not None:
+            return cached
+
+    headers = {}
+    if meta and meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta and meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+
+    try:
+        response = _request(url, params, headers, timeout)
+        if response.status_code == 304 and meta:
+            cached = _load_body(key, meta)
+            if cached is not None:
+                meta['fetched_at'] = now
+                _save_meta(key, meta)
+                return cached
+            # Body went missing; fetch it unconditionally
+            response = _request(url, params, {}, timeout)
+        response.raise_for_status()
+        data = _parse(response.content)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        if meta and (max_stale is None or now - meta['fetched_at'] < max_stale):
+            cached = _load_body(key, meta)
+            if cached is not None:
+                print(f"Warning: request to {url} failed, serving cached copy: {e}")
+                return cached
+        raise
+
+    if transform is not None:
+        data = transform(data)
+    meta = {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'fetched_at': now,
+    }
+    _store(key, meta, data)
+    return data
+
+def clear():
+    _PARSED.clear()
+    for path, _ in _entries():
+        _remove(path)
+
+def _request(url, params, headers, timeout):
+    for attempt in range(MAX_RETRIES):
+        response = requests.get(url, params=params, headers=headers, timeout=timeout)
+        if response.status_code != 429 or attempt == MAX_RETRIES - 1:
+            return response
+        delay = BASE_DELAY * (2 ** attempt)
+        print(f"Rate limited by {url}, waiting {delay} seconds...")
+        time.sleep(delay)
+
+def _parse(raw):
+    return _fast_json.loads(raw) if _fast_json else json.loads(raw)
+
+def _dumps(data):
+    return _fast_json.dumps(data) if _fast_json else json.dumps(data).encode()
+
+def _key(url, params):
+    raw = json.dumps([url, sorted((params or {}).items())]).encode()
+    return hashlib.sha1(raw).hexdigest()
+
+def _directory():
+    return os.path.join(_resolve_cache_dir(), 'http')
+
+def _body_path(key):
+    return os.path.join(_directory(), f'{key}.json.gz')
+
+def _meta_path(key):
+    return os.path.join(_directory(), f'{key}.meta.json')
+
+def _load_meta(key):
+    try:
+        with open(_meta_path(key), 'r') as file:
+            return json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def _save_meta(key, meta):
+    _write(_meta_path(key), json.dumps(meta).encode())
+
+def _load_body(key, meta):
+    parsed = _PARSED.get(key)
+    if parsed and parsed[:2] == (meta.get('etag'), meta.get('last_modified')):
+        return parsed[2]
+    try:
+        with gzip.open(_body_path(key), 'rb') as file:
+            data = _parse(file.read())
+    except (OSError, EOFError, ValueError):
+        return None
+    os.utime(_body_path(key))  # mtime doubles as LRU recency for eviction
+    _PARSED[key] = (meta.get('etag'), meta.get('last_modified'), data)
+    return data
+
+def _store(key, meta, data):
+    _PARSED[key] = (meta['etag'], meta['last_modified'], data)
+    body = gzip.compress(_dumps(data))
+    if len(body) > MAX_BYTES:
+        return
+    _write(_body_path(key), body)
+    _save_meta(key, meta)
+    _evict()
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+
+def _evict():
+    """Drop least recently used bodies until the cache is under MAX_BYTES."""
+    entries = []
+    for path, size in _entries(('.json.gz',)):
+        try:
+            entries.append((os.path.getmtime(path), path, size))
+        except OSError:
+            continue
+    total = sum(size for _, _, size in entries)
+    for _, path, size in sorted(entries):
+        if total <= MAX_BYTES:
+            break
+        _remove(path)
+        _remove(path[:-len('.json.gz')] + '.meta.json')
+        total -= size
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _entries(suffixes=('.json.gz', '.meta.json')):
+    directory = _directory()
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith(suffixes):
+            path = os.path.join(directory, name)
+            try:
+                yield path, os.path.getsize(path)
+            except OSError:
+                continue
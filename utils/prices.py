@@ -0,0 +1,79 @@
+import requests
+from utils import http_cache
+
+# Run-wide DefiLlama price service. Stages register the tokens they will need
+# up front; the first lookup resolves everything registered in one request and
+# later lookups are served from memory, so every stage sees the same prices.
+
+LLAMA_URL = 'https://coins.llama.fi/prices/current/{coins}?searchWidth={search_width}'
+SEARCH_WIDTH = '40h'
+MAX_URL_LENGTH = 4000
+REQUEST_TIMEOUT = 10
+PRICE_TTL = 60
+STALE_TTL = 15 * 60
+
+_PRICES = {}        # search width -> {lowercase address: price}
+_UNPRICED = {}      # search width -> lowercase addresses DefiLlama had no price for this run
+_PENDING = set()    # registered but not yet resolved (default search width)
+
+def register_tokens(tokens):
+    """Queue tokens to be resolved with the next price request."""
+    prices, unpriced = _PRICES.get(SEARCH_WIDTH, {}), _UNPRICED.get(SEARCH_WIDTH, set())
+    for token in tokens:
+        token = str(token).lower()
+        if token not in prices and token not in unpriced:
+            _PENDING.add(token)
+
+def get_prices(tokens=[], search_width=SEARCH_WIDTH):
+    """
+    Return {token: price} for the requested tokens, keyed as passed in.
+    Tokens without a DefiLlama price are omitted. Registered tokens are only
+    batched in at the default search width.
+    """
+    tokens = [str(t) for t in tokens]
+    if search_width == SEARCH_WIDTH:
+        register_tokens(tokens)
+        pending = sorted(_PENDING)
+    else:
+        known = set(_PRICES.get(search_width, {})) | _UNPRICED.get(search_width, set())
+        pending = sorted({t.lower() for t in tokens} - known)
+    if pending:
+        _resolve(pending, search_width)
+    prices = _PRICES.get(search_width, {})
+    return {t: prices[t.lower()] for t in tokens if t.lower() in prices}
+
+def _resolve(tokens, search_width):
+    fetched, answered = {}, []
+    for batch in _batches(tokens):
+        try:
+            fetched.update(_fetch(batch, search_width))
+            answered += batch
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            # Tokens from a failed request stay unresolved and are retried next lookup
+            print(f"Warning: DefiLlama price request failed: {e}")
+    _PRICES.setdefault(search_width, {}).update(fetched)
+    _UNPRICED.setdefault(search_width, set()).update(t for t in answered if t not in fetched)
+    if search_width == SEARCH_WIDTH:
+        _PENDING.difference_update(answered)
+
+def _batches(tokens):
+    """Split tokens so each request URL stays under MAX_URL_LENGTH."""
+    batch, length = [], len(LLAMA_URL)
+    for t in tokens:
+        coin_length = len(f'ethereum:{t},')
+        if batch and length + coin_length > MAX_URL_LENGTH:
+            yield batch
+            batch, length = [], len(LLAMA_URL)
+        batch.append(t)
+        length += coin_length
+    if batch:
+        yield batch
+
+def _fetch(tokens, search_width):
+    # Served from the HTTP cache for PRICE_TTL, and up to STALE_TTL if DefiLlama is down
+    coins = ','.join(f'ethereum:{t}' for t in tokens)
+    data = http_cache.get_json(
+        LLAMA_URL.format(coins=coins, search_width=search_width),
+        ttl=PRICE_TTL, timeout=REQUEST_TIMEOUT, max_stale=STALE_TTL,
+    )
+    return {key.replace('ethereum:', '').lower(): value['price'] for key, value in data['coins'].items()}
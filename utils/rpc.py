@@ -0,0 +1,67 @@
+import requests
+from brownie import web3
+from web3 import HTTPProvider
+
+# JSON-RPC batching through the connected provider, for reads that brownie
+# would otherwise issue one request at a time (block headers, storage slots).
+
+BATCH_SIZE = 100
+REQUEST_TIMEOUT = 30
+
+def multicall_value(result):
+    """Plain value behind a brownie multicall result; None if the call failed."""
+    # LazyResult wraps a Result proxy, which wraps the decoded value
+    while hasattr(result, '__wrapped__'):
+        result = result.__wrapped__
+    return result
+
+def batch_call(calls):
+    """
+    Send [(method, params), ...] and return results in order. HTTP providers get
+    JSON-RPC batches with the provider's own headers, auth and timeouts; other
+    providers fall back to one make_request per call.
+    """
+    provider = web3.provider
+    if not isinstance(provider, HTTPProvider):
+        return _sequential(provider, calls)
+
+    request_kwargs = dict(provider.get_request_kwargs())
+    request_kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+    results = []
+    for i in range(0, len(calls), BATCH_SIZE):
+        chunk = calls[i:i + BATCH_SIZE]
+        payload = [
+            {"jsonrpc": "2.0", "method": method, "params": params, "id": j}
+            for j, (method, params) in enumerate(chunk)
+        ]
+        response = requests.post(str(provider.endpoint_uri), json=payload, **request_kwargs)
+        response.raise_for_status()
+        replies = response.json()
+        if not isinstance(replies, list):
+            # Endpoint rejected the batch as a whole; send this chunk one call at a time
+            results += _sequential(provider, chunk)
+            continue
+        replies = {reply.get('id'): reply for reply in replies}
+        results += [_result(method, params, replies.get(j)) for j, (method, params) in enumerate(chunk)]
+    return results
+
+def _sequential(provider, calls):
+    return [_result(method, params, provider.make_request(method, params)) for method, params in calls]
+
+def _result(method, params, reply):
+    if reply is None or 'error' in reply:
+        error = reply.get('error') if reply else 'missing reply'
+        raise Exception(f"{method}{params} failed: {error}")
+    return reply['result']
+
+def get_block_timestamps(blocks):
+    """{block: timestamp} for every distinct block, fetched in batches."""
+    blocks = sorted(set(blocks))
+    headers = batch_call([('eth_getBlockByNumber', [hex(b), False]) for b in blocks])
+    return {b: int(header['timestamp'], 16) for b, header in zip(blocks, headers)}
+
+def get_storage_at(reads):
+    """{(address, slot, block): int} for (address, slot, block) tuples, each distinct read sent once."""
+    reads = sorted(set(reads))
+    values = batch_call([('eth_getStorageAt', [address, hex(slot), hex(block)]) for address, slot, block in reads])
+    return {read: int(value, 16) for read, value in zip(reads, values)}
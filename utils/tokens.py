@@ -0,0 +1,75 @@
+import os
+import json
+from brownie import Contract, multicall
+from utils.cache import _resolve_cache_dir
+from utils.rpc import multicall_value
+
+# Token metadata (decimals, symbol) never changes, so it is read once per token
+# with multicall and persisted in the cache dir for every later run.
+
+ERC20_METADATA_ABI = [
+    {
+        'name': 'decimals', 'type': 'function', 'stateMutability': 'view',
+        'inputs': [], 'outputs': [{'name': '', 'type': 'uint8'}],
+    },
+    {
+        'name': 'symbol', 'type': 'function', 'stateMutability': 'view',
+        'inputs': [], 'outputs': [{'name': '', 'type': 'string'}],
+    },
+]
+
+_METADATA = None    # lowercase address -> {'decimals': int, 'symbol': str}
+
+def get_token_metadata(tokens):
+    """{token: {'decimals', 'symbol'}} keyed as passed in; unknown tokens are read in one multicall."""
+    metadata = _load()
+    tokens = [str(t) for t in tokens]
+    missing = sorted({t.lower() for t in tokens} - set(metadata))
+    if missing:
+        with multicall():
+            calls = {}
+            for token in missing:
+                contract = Contract.from_abi('ERC20', token, ERC20_METADATA_ABI)
+                calls[token] = (contract.decimals(), contract.symbol())
+        failed = []
+        for token, (decimals, symbol) in calls.items():
+            decimals, symbol = multicall_value(decimals), multicall_value(symbol)
+            if decimals is None or symbol is None:
+                failed.append(token)
+                continue
+            metadata[token] = {'decimals': int(decimals), 'symbol': str(symbol)}
+        _save()
+        # Calls that fail to decode (e.g. bytes32 symbols) are retried with the
+        # token's full ABI; only successful reads are persisted.
+        for token in failed:
+            contract = Contract(token)
+            metadata[token] = {'decimals': int(contract.decimals()), 'symbol': str(contract.symbol())}
+            _save()
+    return {t: metadata[t.lower()] for t in tokens}
+
+def get_decimals(token):
+    return get_token_metadata([token])[str(token)]['decimals']
+
+def get_symbol(token):
+    return get_token_metadata([token])[str(token)]['symbol']
+
+def _path():
+    return os.path.join(_resolve_cache_dir(), 'token_metadata.json')
+
+def _load():
+    global _METADATA
+    if _METADATA is None:
+        try:
+            with open(_path(), 'r') as handle:
+                _METADATA = json.load(handle)
+        except (OSError, json.JSONDecodeError):
+            _METADATA = {}
+    return _METADATA
+
+def _save():
+    path = _path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as handle:
+        json.dump(_METADATA, handle, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
@@ -1,10 +1,11 @@
 import constants
-from brownie import ZERO_ADDRESS, Contract, web3, accounts, chain
-import constants, requests, json
+from brownie import Contract, web3, accounts, chain
+import constants, requests, json, os
 from datetime import datetime
 from functools import lru_cache
-from utils.cache import memory
-import time
+from utils.cache import memory, HEAD
+from utils.prices import get_prices, register_tokens
+from utils import ens, http_cache
 
 DAY = 60 * 60 * 24
 WEEK = DAY * 7
@@ -19,7 +20,7 @@ def get_week_by_ts(contract, ts):
     diff = ts - first_week_start_ts
     return diff // WEEK
 
-@memory.cache()
+@memory.cache(kind=HEAD)
 def get_launch_week(contract):
     deploy_block = contract_creation_block(contract)
     deploy_ts = chain[deploy_block].timestamp
@@ -34,7 +35,7 @@ def get_week_start_block(contract, week_number=0):
     ts = get_week_start_ts(contract, week_number)
     return closest_block_after_timestamp(ts)
 
-@memory.cache()
+@memory.cache(kind=HEAD)
 def get_week_start_ts(contract, week_number=0):
     contract = Contract(contract)
     current_week = contract.getWeek()
@@ -57,7 +58,7 @@ def get_past_week_end_block(contract, week_number=0):
     ts = get_week_start_ts(contract, week_number) + WEEK
     return closest_block_after_timestamp(ts) - 1
 
-@memory.cache()
+@memory.cache(kind=HEAD)
 def get_week_end_ts(contract, week_number=0):
     """
         This will always be precise. Never returns chain.time()
@@ -121,115 +122,81 @@ def timestamp_to_string(ts):
     dt = datetime.utcfromtimestamp(ts).strftime("%m/%d/%Y, %H:%M:%S")
     return dt
 
-def get_prices(tokens=[]):
-    # Query DefiLlama for all of our coin prices
-    coins = ','.join(f'ethereum:{k}' for k in tokens)
-    url = f'https://coins.llama.fi/prices/current/{coins}?searchWidth=40h'
-    response = requests.get(url).json()['coins']
-    response = {key.replace('ethereum:', ''): value for key, value in response.items()}
-    prices = {}
-    for t in tokens:
-        if t in response:
-            prices[t] = response[t]['price']
-    return prices
-
-# Global cache for CoinGecko tokens
+COINGECKO_TOKENS_URL = "https://tokens.coingecko.com/uniswap/all.json"
+SMOLDAPP_TOKENS_URL = "https://raw.githubusercontent.com/SmolDapp/tokenLists/main/lists/coingecko.json"
+TOKEN_INDEX_RECHECK = 60 * 60
+
+# Global caches for the token list indexes
 _COINGECKO_TOKENS = None
+_SMOLDAPP_TOKENS = None
 
-@memory.cache()
 def get_coingecko_tokens():
-    """Fetch CoinGecko token list with caching and retry logic"""
+    """
+    CoinGecko token list as a lowercase address -> {logoURI, symbol, decimals} index.
+    Persisted through the HTTP cache and revalidated with a conditional GET, so the
+    multi-MB list is only downloaded again when it has changed.
+    """
     global _COINGECKO_TOKENS
-    if _COINGECKO_TOKENS is not None:
-        return _COINGECKO_TOKENS
-
-    url = "https://tokens.coingecko.com/uniswap/all.json"
-    max_retries = 3
-    base_delay = 2
-
-    for attempt in range(max_retries):
-        try:
-            response = requests.get(url, timeout=5)
-
-            if response.status_code == 429:
-                delay = base_delay * (2 ** attempt)
-                print(f"Rate limited by CoinGecko, waiting {delay} seconds...")
-                time.sleep(delay)
-                continue
-
-            if response.status_code != 200:
-                print(f"Warning: CoinGecko request failed with status {response.status_code}")
-                return None
-
-            _COINGECKO_TOKENS = response.json()
-            return _COINGECKO_TOKENS
-
-        except (requests.exceptions.RequestException, requests.exceptions.JSONDecodeError) as e:
-            print(f"Warning: Failed to fetch CoinGecko tokens: {str(e)}")
-            if attempt < max_retries - 1:
-                time.sleep(base_delay * (2 ** attempt))
-                continue
-            return None
-
-    return None
+    if _COINGECKO_TOKENS is None:
+        _COINGECKO_TOKENS = _load_token_index('coingecko', COINGECKO_TOKENS_URL)
+    return _COINGECKO_TOKENS
+
+def get_smoldapp_tokens():
+    """SmolDapp token list, indexed the same way and refreshed at most once a day."""
+    global _SMOLDAPP_TOKENS
+    if _SMOLDAPP_TOKENS is None:
+        _SMOLDAPP_TOKENS = _load_token_index('smoldapp', SMOLDAPP_TOKENS_URL, recheck=DAY)
+    return _SMOLDAPP_TOKENS
+
+def _index_token_list(data):
+    return {
+        token['address'].lower(): {
+            'logoURI': token.get('logoURI'),
+            'symbol': token.get('symbol'),
+            'decimals': token.get('decimals'),
+        }
+        for token in data.get('tokens', [])
+    }
+
+def _load_token_index(name, url, recheck=TOKEN_INDEX_RECHECK):
+    try:
+        return http_cache.get_json(url, ttl=recheck, transform=_index_token_list)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"Warning: Failed to fetch {name} token list: {str(e)}")
+        return {}
 
 def get_token_logo_url(token_address):
-    """Wrapper to ensure cached function sees simple string inputs."""
-    return _get_token_logo_url_cached(str(token_address))
-
-
-@memory.cache()
-def _get_token_logo_url_cached(token_address: str):
     """Get token logo URL from CoinGecko or SmolDapp fallback"""
-    try:
-        # First try CoinGecko using cached data
-        if token_address not in [
-            '0xf939E0A03FB07F59A73314E73794Be0E57ac1b4E', # crvusd
-            '0x7f39C581F595B53c5cb19bD0b3f8dA6c935E2Ca0', # wsteth
-        ]:
-            tokens = get_coingecko_tokens()
-            if tokens and 'tokens' in tokens:
-                for token in tokens['tokens']:
-                    if token['address'].lower() == token_address.lower():
-                        return token['logoURI']
-
-        # Fallback to SmolDapp token assets
-        return f"https://assets.smold.app/api/token/1/{token_address}/logo-32.png"
+    token_address = str(token_address)
+    # First try the CoinGecko index
+    if token_address not in [
+        '0xf939E0A03FB07F59A73314E73794Be0E57ac1b4E', # crvusd
+        '0x7f39C581F595B53c5cb19bD0b3f8dA6c935E2Ca0', # wsteth
+    ]:
+        token = get_coingecko_tokens().get(token_address.lower())
+        if token and token['logoURI']:
+            return token['logoURI']
 
-    except requests.exceptions.RequestException as e:
-        print(f"Warning: Request failed for token {token_address}: {str(e)}")
-        return None
-
-    return None
-
-
-def get_token_logo_urls(token_address):
-    return _get_token_logo_urls_cached(str(token_address))
+    # Fallback to SmolDapp token assets
+    return f"https://assets.smold.app/api/token/1/{token_address}/logo-32.png"
 
 
 TOKEN_LOGO_OVERRIDES = {
     '0x22222222aEA0076fCA927a3f44dc0B4FdF9479D6': 'https://etherscan.io/token/images/yearn_yyb.png', # yYB
 }
 
-@memory.cache()
-def _get_token_logo_urls_cached(token_address):
+def get_token_logo_urls(token_address):
+    token_address = str(token_address)
     if token_address in TOKEN_LOGO_OVERRIDES:
         return TOKEN_LOGO_OVERRIDES[token_address]
-    url = 'https://raw.githubusercontent.com/SmolDapp/tokenLists/main/lists/coingecko.json'
-    data = requests.get(url).json()
-    logo_url = ''
-    for d in data['tokens']:
-        if token_address == d['address']:
-            logo_url = d['logoURI']
-            return logo_url
+    token = get_smoldapp_tokens().get(token_address.lower())
+    if token and token['logoURI']:
+        return token['logoURI']
     # Fallback to SmolDapp
     return f"https://assets.smold.app/api/token/1/{token_address}/logo-128.png"
 
 def get_ens_from_cache(address):
-    ens_data = load_from_json('ens_cache.json')
-    if address in ens_data:
-        return ens_data[address]
-    return ''
+    return ens.get_name(address)
 
 @memory.cache()
 def contract_creation_block(address):
@@ -270,26 +237,11 @@ def get_logs_chunked(contract, event_name, start_block=0, end_block=0, chunk_siz
     return logs
 
 def cache_ens():
-    ens_data = load_from_json('ens_cache.json')
-    if ens_data is None:
-        ens_data = {}
-
     records = load_from_json('raw_boost_data.json')['data']
-
-    count = 0
+    addresses = set()
     for record in records:
-        a, r, d = record['account'], record['receiver'], record['boost_delegate']
-        count += 1
-        for address in [a, r, d]:
-            if address == ZERO_ADDRESS:
-                continue
-            # if address not in ens_data or ens_data[address] is '':
-            if address not in ens_data:
-                ens = web3.ens.name(address)
-                ens = '' if ens is None or ens == 'null' else ens
-                ens_data[address] = ens
-                print(address, ens)
-    cache_to_json('ens_cache.json', ens_data)
+        addresses.update([record['account'], record['receiver'], record['boost_delegate']])
+    ens.resolve(addresses)
 
 # Loading the dictionary from a JSON file
 # Should add .json file extension to the end
@@ -306,18 +258,41 @@ def cache_to_json(file_path, data_dict):
     with open(file_path, 'w') as file:
         json.dump(data_dict, file, indent=4)
 
-def sql_query_boost_data(sql):
-    import pandas as pd
-    import duckdb
-    import requests
-    url = 'https://raw.githubusercontent.com/wavey0x/open-data/master/raw_boost_data.json'
-    data = requests.get(url).json()['data']
-    df = pd.DataFrame(data)
+def write_json_atomic(file_path, data, indent=4):
+    """Write JSON to a temp file and swap it in, so readers never see a partial file."""
+    directory = os.path.dirname(file_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{file_path}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(data, file, indent=indent)
+    os.replace(tmp_path, file_path)
+
+RAW_BOOST_DATA_URL = 'https://raw.githubusercontent.com/wavey0x/open-data/master/raw_boost_data.json'
+
+def get_raw_boost_data():
+    """Published boost records, revalidated against GitHub at most every 15 minutes."""
+    return http_cache.get_json(RAW_BOOST_DATA_URL, ttl=15 * 60)['data']
 
-    # load data into virtual db
+# Local DuckDB mirror of the boost records, maintained by scripts/prisma/boost_logs.py
+BOOST_DB_PATH = os.getenv('BOOST_DB_PATH', 'boost_data.duckdb')
+
+def boost_data_connection():
+    """
+    Read-only DuckDB connection exposing the `boost_data` table. Falls back to
+    loading the published JSON in memory when there is no local mirror.
+    """
+    import duckdb
+    if os.path.exists(BOOST_DB_PATH):
+        return duckdb.connect(BOOST_DB_PATH, read_only=True)
+    import pandas as pd
     con = duckdb.connect(database=':memory:')
-    con.register('boost_data', df)
+    con.register('boost_data', pd.DataFrame(get_raw_boost_data()))
+    return con
 
+def sql_query_boost_data(sql):
+    import pandas as pd
+    con = boost_data_connection()
     results = con.execute(sql).fetchdf()
     pd.set_option('display.max_colwidth', None)
     return results